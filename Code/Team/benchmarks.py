@@ -0,0 +1,438 @@
+"""
+Benchmarks for movielens_analysis.
+Run: python benchmarks.py
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from array import array
+from collections import Counter
+from itertools import islice
+
+from bs4 import BeautifulSoup
+
+from movielens_analysis import (top_n, iter_csv_as_dict, iter_csv_records, read_csv_as_dict, Link, Links, Movie,
+                                MovieCatalog, MovieIdSet, Rating, Ratings, RatingsTable, Snapshot, Tag, TagIndex, Tests)
+
+
+def bench(label, stmt, number=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=3)) / number
+    print(f"{label:<55} {best * 1000:10.2f} ms")
+    return best
+
+
+def bench_top_n(n=10):
+    """sorted(...)[:n] against top_n on group sizes of the full MovieLens data."""
+    random.seed(0)
+    movie_scores = {movie_id: round(random.uniform(0.5, 5), 2) for movie_id in range(60_000)}
+    user_variances = {user_id: round(random.uniform(0, 4), 2) for user_id in range(160_000)}
+    print(f"top-{n} selection")
+    for label, groups in (("60k movies", movie_scores), ("160k users", user_variances)):
+        sort_time = bench(f"  sorted()[:n], {label}",
+                          lambda: sorted(groups.items(), key=lambda x: x[1], reverse=True)[:n])
+        heap_time = bench(f"  top_n(), {label}",
+                          lambda: top_n(groups.items(), n, key=lambda x: x[1]))
+        print(f"  speedup: {sort_time / heap_time:.1f}x")
+
+
+def synthetic_imdb_page(blocks=1500):
+    """A page of about the size of a real IMDb title page: the data items among a lot of other markup."""
+    page = Tests.TestLinksClass.imdb_page(*Tests.TestLinksClass.IMDB_PAGES['0114709'])
+    filler = ''.join(
+        f'<div class="ipc-block-{i}"><a href="/name/nm{i:07d}/"><span>Actor {i}</span></a>'
+        f'<ul><li role="presentation"><span>Character {i}</span></li></ul></div>'
+        for i in range(blocks)
+    )
+    script = '<script id="__NEXT_DATA__" type="application/json">' + '{"k": "v"}' * 20000 + '</script>'
+    return page.replace('<body>', '<body>' + filler, 1).replace('</body>', script + '</body>', 1)
+
+
+def legacy_soup_fields(soup):
+    """Links.__Make_dict before ImdbPageParser replaced it."""
+    dic = {
+        'Director': 'Unknown',
+        'Budget': '0',
+        'Gross worldwide': '0',
+        'Gross US & Canada': '0',
+        'Opening weekend US & Canada': '0',
+        'Runtime': '0',
+        'Title': '-'
+    }
+
+    # Title
+    try:
+        title_tag = soup.find('h1')
+        if title_tag:
+            dic['Title'] = title_tag.text.strip()
+    except:
+        pass
+
+    # Director
+    try:
+        director_section = soup.find('li', {'data-testid': 'title-pc-principal-credit'})
+        if director_section:
+            director_link = director_section.find('a')
+            if director_link:
+                dic['Director'] = director_link.text.strip()
+    except:
+        pass
+
+    # Runtime
+    try:
+        runtime_li = soup.find('li', {'data-testid': 'title-techspec_runtime'})
+        if runtime_li:
+            runtime_text = runtime_li.text.strip()
+            runtime_clean = runtime_text.replace("Runtime", "").strip()
+            dic['Runtime'] = runtime_clean
+    except:
+        pass
+
+    # Box office section
+    try:
+        box_office_section = soup.find_all('li', {'data-testid': 'title-boxoffice-section'})
+        if not box_office_section:
+            box_office_section = soup.find_all('li', {'data-testid': re.compile(r'title-boxoffice.*')})
+        for li in box_office_section:
+            key_span = li.find('span', string=True)
+            val_span = li.find_all('span')[-1]
+            if key_span and val_span:
+                key = key_span.text.strip()
+                val = val_span.text.strip()
+                if key in dic:
+                    dic[key] = val
+    except:
+        pass
+
+    return dic
+
+def legacy_soup_rating(soup):
+    try:
+        rating_label = soup.find(string='IMDb RATING')
+        if not rating_label:
+            return None
+        rating = rating_label.find_next().text.strip()[:6]
+        return rating
+    except AttributeError:
+        return None
+
+
+def legacy_soup_parse(html):
+    """The BeautifulSoup path of Links.parse_page that ImdbPageParser replaced, kept as the baseline."""
+    soup = BeautifulSoup(html, "html.parser")
+    record = legacy_soup_fields(soup)
+    record['Rating'] = legacy_soup_rating(soup)
+    title_tag = soup.find('title')
+    record['Page title'] = title_tag.text if title_tag else None
+    return record
+
+
+def bench_imdb_parser(pages_dir=None):
+    """
+    BeautifulSoup path against ImdbPageParser on saved IMDb pages (*.html in pages_dir),
+    or on a synthetic page when no directory is given.
+    """
+    if pages_dir:
+        pages = []
+        for name in sorted(os.listdir(pages_dir)):
+            if name.endswith('.html'):
+                with open(os.path.join(pages_dir, name), encoding='utf-8') as f:
+                    pages.append(f.read())
+    else:
+        pages = [synthetic_imdb_page()]
+    print(f"IMDb page parsing, {len(pages)} page(s), {sum(map(len, pages)) // 1024} KiB")
+    for page in pages:
+        assert legacy_soup_parse(page) == Links.parse_page(page)
+    soup_time = bench("  BeautifulSoup tree + find()", lambda: [legacy_soup_parse(p) for p in pages], 3)
+    fast_time = bench("  ImdbPageParser streaming pass", lambda: [Links.parse_page(p) for p in pages], 3)
+    print(f"  speedup: {soup_time / fast_time:.1f}x")
+
+
+def legacy_movies_parse(path):
+    """The per-line first/last comma split that MovieCatalog.parse replaced, kept as the baseline."""
+    movies = []
+    with open(path, 'r', encoding='utf-8') as file:
+        file.readline()
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            last_comma = line.rfind(',')
+            if last_comma == -1:
+                continue
+            genres_str = line[last_comma + 1:].strip()
+            left = line[:last_comma]
+            first_comma = left.find(',')
+            if first_comma == -1:
+                continue
+            movie_id_str = left[:first_comma].strip()
+            title = left[first_comma + 1:].strip()
+            if '"' in title:
+                if title.split('"')[0] != '' or title.split('"')[-1] != '':
+                    continue
+            else:
+                if len(title.split(',')) != 1:
+                    continue
+            title = title.strip('"')
+            genres = [g.strip() for g in genres_str.split('|')] if genres_str else []
+            try:
+                movies.append({"movieId": int(movie_id_str), "title": title, "genres": genres})
+            except ValueError:
+                continue
+    return movies
+
+
+def synthetic_movies_csv(path, rows=87_000):
+    """movies.csv of the size of the full MovieLens catalog, with title lengths and quoting like the real one."""
+    random.seed(0)
+    words = ["Love", "Night", "Story", "City", "King", "Dark", "Man", "Last", "House", "Girl", "World", "Blue"]
+    genres = ["Action", "Adventure", "Animation", "Children", "Comedy", "Crime", "Drama", "Horror", "Sci-Fi"]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(MovieCatalog.HEADER + "\n")
+        for movie_id in range(1, rows + 1):
+            title = f"{' '.join(random.choices(words, k=random.randint(1, 5)))} ({random.randint(1900, 2023)})"
+            if movie_id % 8 == 0:
+                title = f'"{title.replace(" (", ", The (", 1)}"'
+            elif movie_id % 97 == 0:
+                title = f'"""{title}"" Special"'
+            f.write(f"{movie_id},{title},{'|'.join(random.sample(genres, random.randint(1, 4)))}\n")
+
+
+def bench_movies_parse(path=None):
+    """Old per-line string surgery against MovieCatalog.parse on movies.csv (synthetic 87k rows by default)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if path is None:
+            path = os.path.join(tmp, "movies.csv")
+            synthetic_movies_csv(path)
+        print(f"movies.csv parsing, {len(MovieCatalog.parse(path))} movies")
+        legacy_time = bench("  per-line first/last comma split", lambda: legacy_movies_parse(path))
+        csv_time = bench("  MovieCatalog.parse (csv module)", lambda: MovieCatalog.parse(path))
+        print(f"  speedup: {legacy_time / csv_time:.1f}x")
+
+
+def bench_genre_index(movies_path=None, ratings_path=None, ratings=2_000_000):
+    """
+    Genre lists against the catalog's genre bitmasks and posting lists.
+    Pass the ml-25m movies.csv and ratings.csv to measure on the full data;
+    by default a synthetic catalog and movie id column are used.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if movies_path is None:
+            movies_path = os.path.join(tmp, "movies.csv")
+            synthetic_movies_csv(movies_path)
+        catalog = MovieCatalog(MovieCatalog.parse(movies_path))
+    movies = catalog.movies
+    if ratings_path:
+        movie_ids = RatingsTable.from_csv(ratings_path).movie_id
+    else:
+        random.seed(0)
+        ids = [m["movieId"] for m in movies]
+        movie_ids = array('i', (random.choice(ids) for _ in range(ratings)))
+    movie_genres = {m["movieId"]: m["genres"] for m in movies}
+    print(f"genre filters, {len(movies)} movies, {len(movie_ids)} ratings")
+
+    def combinations_by_lists():
+        return Counter('|'.join(sorted(m["genres"])) for m in movies if m["genres"]).most_common(10)
+
+    def combinations_by_masks():
+        counts = Counter(mask for mask in catalog.genre_mask if mask)
+        return Counter({'|'.join(catalog.genre_names(mask)): c for mask, c in counts.items()}).most_common(10)
+
+    def ratings_by_lists():
+        return sum(1 for movie_id in movie_ids if "Drama" in movie_genres.get(movie_id, []))
+
+    def ratings_by_postings():
+        matching = set(catalog.movie_ids_by_genre("Drama"))
+        return sum(1 for movie_id in movie_ids if movie_id in matching)
+
+    assert combinations_by_lists() == combinations_by_masks()
+    assert ratings_by_lists() == ratings_by_postings()
+    for label, old, new in (
+            ("movies_by_genre", lambda: [m["title"] for m in movies if "Drama" in m["genres"]],
+             lambda: [m["title"] for m in catalog.genre_index.get("Drama", [])]),
+            ("common_genre_combinations", combinations_by_lists, combinations_by_masks),
+            ("genre filter over ratings", ratings_by_lists, ratings_by_postings)):
+        old_time = bench(f"  {label}: genre lists", old, 3)
+        new_time = bench(f"  {label}: masks / postings", new, 3)
+        print(f"  speedup: {old_time / new_time:.1f}x")
+
+
+def synthetic_tags(rows=1_000_000, distinct=70_000, movies=45_000):
+    """{movieId: [tags]} with about as many rows and distinct tags as ml-25m tags.csv."""
+    random.seed(0)
+    words = ["dark", "comedy", "based on a book", "twist ending", "atmospheric", "sci-fi", "visually appealing",
+             "Netflix", "queue", "funny", "BD-R", "nudity (topless)", "classic", "superhero", "murder"]
+    vocabulary = [f"{' '.join(random.sample(words, random.randint(1, 3)))} {i}" for i in range(distinct)]
+    movie_tags = {}
+    for _ in range(rows):
+        movie_tags.setdefault(random.randint(1, movies), []).append(random.choice(vocabulary))
+    return movie_tags
+
+
+def bench_tag_search(queries=("dark", "ending 12", "netflix queue", "z", "superhero 4")):
+    """Substring scan over all tags against TagIndex lookups."""
+    movie_tags = synthetic_tags()
+    tags = {tag for movie_tag_list in movie_tags.values() for tag in movie_tag_list}
+    started = timeit.default_timer()
+    index = TagIndex(tags, movie_tags)
+    print(f"tag search, {len(tags)} distinct tags, {sum(map(len, movie_tags.values()))} rows, "
+          f"index built in {timeit.default_timer() - started:.1f} s")
+    for query in queries:
+        assert index.tags_containing(query) == sorted({tag for tag in tags if query.lower() in tag.lower()})
+        scan_time = bench(f"  tags_with({query!r}): scan",
+                          lambda: sorted({tag for tag in tags if query.lower() in tag.lower()}), 3)
+        index_time = bench(f"  tags_with({query!r}): index ({len(index.containing(query))} tags)",
+                           lambda: index.tags_containing(query), 3)
+        print(f"  speedup: {scan_time / index_time:.0f}x")
+
+
+def synthetic_ratings_csv(path, movie_ids, rows=2_000_000):
+    random.seed(0)
+    with open(path, "w") as f:
+        f.write("userId,movieId,rating,timestamp\n")
+        f.writelines(f"{random.randint(1, 160_000)},{random.choice(movie_ids)},{random.randint(1, 10) / 2},"
+                     f"{random.randint(789_652_009, 1_574_327_703)}\n" for _ in range(rows))
+
+
+def bench_parallel_load(ratings_path=None, workers=(2, 4, 8)):
+    """Serial RatingsTable.from_csv against the process pool loader; the speedup is bounded by os.cpu_count()."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if ratings_path is None:
+            ratings_path = os.path.join(tmp, "ratings.csv")
+            synthetic_ratings_csv(ratings_path, list(range(1, 60_000)))
+        serial = RatingsTable.from_csv(ratings_path)
+        print(f"parallel ratings load, {len(serial)} rows, {os.cpu_count()} cpus")
+        serial_time = bench("  serial", lambda: RatingsTable.from_csv(ratings_path), 1)
+        for n in workers:
+            assert RatingsTable.from_csv(ratings_path, workers=n).columns() == serial.columns()
+            parallel_time = bench(f"  {n} workers", lambda: RatingsTable.from_csv(ratings_path, workers=n), 1)
+            print(f"  speedup: {serial_time / parallel_time:.1f}x")
+
+
+def bench_streaming(ratings_path=None, rows=1_000_000):
+    """Peak memory and time of counting ratings per movie from a list of rows against streamed rows and batches."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if ratings_path is None:
+            ratings_path = os.path.join(tmp, "ratings.csv")
+            synthetic_ratings_csv(ratings_path, list(range(1, 60_000)), rows)
+        print("streaming aggregation: ratings per movie")
+
+        def count_batches():
+            counts = Counter()
+            for batch in RatingsTable.iter_csv(ratings_path):
+                counts.update(batch.movie_id)
+            return counts
+
+        for label, count in (
+                ("read_csv_as_dict", lambda: Counter(row["movieId"] for row in read_csv_as_dict(ratings_path))),
+                ("iter_csv_as_dict", lambda: Counter(row["movieId"] for row in iter_csv_as_dict(ratings_path))),
+                ("RatingsTable.iter_csv", count_batches)):
+            tracemalloc.start()
+            count()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            bench(f"  {label} (peak {peak / 2 ** 20:.0f} MiB)", count, 1)
+
+
+def bench_movie_id_filter(ratings_path=None, rows=1_000_000, shares=(0.01, 0.1, 1.0)):
+    """
+    RatingsTable.from_csv with valid_movie_ids keeping a share of the movies, with and without
+    the MovieIdSet prefilter (without it every line is split and converted before the check).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        movie_ids = list(range(1, 60_000))
+        if ratings_path is None:
+            ratings_path = os.path.join(tmp, "ratings.csv")
+            synthetic_ratings_csv(ratings_path, movie_ids, rows)
+        print("movieId filter pushdown")
+        bench("  no filter", lambda: RatingsTable.from_csv(ratings_path), 1)
+
+        class Unselected(MovieIdSet):
+            def select(self, lines, *args, **kwargs):
+                return lines
+
+        def load(valid, prefilter):
+            movie_id_set = MovieIdSet(valid) if prefilter else Unselected(valid)
+            return RatingsTable.from_csv(ratings_path, valid_movie_ids=movie_id_set)
+
+        for share in shares:
+            valid = set(movie_ids[::round(1 / share)])
+            assert load(valid, True).columns() == load(valid, False).columns()
+            full_time = bench(f"  {share:.0%} of movies, split every line", lambda: load(valid, False), 1)
+            pushdown_time = bench(f"  {share:.0%} of movies, prefilter", lambda: load(valid, True), 1)
+            print(f"  speedup: {full_time / pushdown_time:.1f}x")
+
+
+def bench_record_memory(dataset_dir=None, rows=100_000):
+    """
+    Bytes per row of dict rows against the __slots__ records, for the first rows of every file.
+    dataset_dir is an ml-latest-small or ml-25m directory; without it synthetic rows are used.
+    Strings and genre lists are shared by both variants and are not counted.
+    """
+    random.seed(0)
+    if dataset_dir:
+        path = lambda name: os.path.join(dataset_dir, name)
+        movies = [m.values() for m in MovieCatalog.parse(path("movies.csv"))]
+        ratings = [r.values() for r in RatingsTable.from_csv(path("ratings.csv"), count_lines=rows).rows()]
+        tags = [t.values() for t in islice(iter_csv_records(path("tags.csv")), rows)]
+        links = [link.values() for link in Links.read_csv_records(path("links.csv"))]
+    else:
+        movies = [(i, f"Movie {i} (1995)", ["Drama"]) for i in range(rows)]
+        ratings = [(i % 600, i % 9000, random.randint(1, 10) / 2, 964982703 + i) for i in range(rows)]
+        tags = [(i % 600, i % 9000, f"tag {i % 1500}", 1445714835 + i) for i in range(rows)]
+        links = [(i, f"{i:07d}", i + 1000) for i in range(rows)]
+    print(f"memory per row{' in ' + dataset_dir if dataset_dir else ''}")
+    for record, values in ((Movie, movies), (Rating, ratings), (Tag, tags), (Link, links)):
+        keys = list(record.KEYS)
+        sizes = []
+        for make in (lambda v: dict(zip(keys, v)), lambda v: record(*v)):
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            built = [make(v) for v in values]
+            sizes.append((tracemalloc.get_traced_memory()[0] - before) / len(built))
+            tracemalloc.stop()
+            del built
+        print(f"  {record.__name__:<8} dict {sizes[0]:6.0f} B   record {sizes[1]:6.0f} B"
+              f"   ({sizes[0] / sizes[1]:.1f}x)")
+
+
+def bench_snapshot(movies_path=None, ratings_path=None, ratings=2_000_000):
+    """Cold load from the CSV files against Snapshot.load of the same data (with the CSR and year indexes)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if movies_path is None:
+            movies_path = os.path.join(tmp, "movies.csv")
+            synthetic_movies_csv(movies_path)
+        if ratings_path is None:
+            ratings_path = os.path.join(tmp, "ratings.csv")
+            synthetic_ratings_csv(ratings_path, [m["movieId"] for m in MovieCatalog.parse(movies_path)], ratings)
+
+        def from_csv():
+            MovieCatalog.clear()
+            loaded = Ratings(ratings_path, movies_path, None)
+            loaded.ratings.movie_index(), loaded.ratings.user_index(), loaded.ratings.years()
+            return loaded
+
+        loaded = from_csv()
+        snapshot_path = os.path.join(tmp, "snapshot")
+        Snapshot.save(snapshot_path, ratings=loaded)
+        size = sum(os.path.getsize(os.path.join(snapshot_path, name)) for name in os.listdir(snapshot_path))
+        print(f"snapshot, {len(loaded.ratings)} ratings, {size / 2 ** 20:.0f} MiB on disk")
+        csv_time = bench("  Ratings from CSV + indexes", from_csv, 1)
+        snapshot_time = bench("  Snapshot.load", lambda: Snapshot.load(snapshot_path), 1)
+        print(f"  speedup: {csv_time / snapshot_time:.0f}x")
+
+
+if __name__ == "__main__":
+    bench_top_n()
+    bench_imdb_parser(sys.argv[1] if len(sys.argv) > 1 else None)
+    bench_movies_parse()
+    bench_genre_index()
+    bench_tag_search()
+    bench_record_memory()
+    bench_streaming()
+    bench_movie_id_filter()
+    bench_snapshot()
+    bench_parallel_load()
@@ -1,8 +1,32 @@
+import io
+import os
+import sys
+import mmap
 import re
+import csv
+import time
+import json
+import copy
+import pickle
+import zlib
+import heapq
+import numbers
+import operator
+import sqlite3
+import threading
+from array import array
+from itertools import chain, islice, repeat
+from bisect import bisect_right
 from collections import defaultdict, Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timezone
+from decimal import Decimal
+from fractions import Fraction
+from html.parser import HTMLParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import pytest
 
 
@@ -22,49 +46,165 @@ def read_file(path_to_the_file, count_lines=10):
         raise Exception(f"Произошла ошибка при работе с файлом {path_to_the_file}: {e}")
 
 def read_csv_as_dict(file_path, delimiter=',', encoding='utf-8', count_lines=None, valid_movie_ids=None):
+    return list(iter_csv_as_dict(file_path, delimiter, encoding, count_lines, valid_movie_ids))
 
-    data = []
-    n1 = ['userId','movieId','rating','timestamp']
-    n2 = ['userId','movieId','tag','timestamp']
+def iter_csv_as_dict(file_path, delimiter=',', encoding='utf-8', count_lines=None, valid_movie_ids=None,
+                     batch_size=None):
+    """
+    Streaming version of read_csv_as_dict: yields the same rows lazily, one at a time
+    or, with batch_size, in lists of batch_size rows (the last one may be shorter).
+    Only the current line (or batch) is kept in memory.
+    """
     try:
         with open(file_path, 'r', encoding=encoding) as f:
 
-            headers = [h.strip() for h in f.readline().strip().split(delimiter)]
-            if headers != n1 and headers != n2:
-                raise Exception("error header")
-            if (len(headers)) != 4:
-                raise Exception("Error")
-                
-
-            line_count = 0
-            for line in f:
-                if count_lines and line_count >= count_lines:
+            headers = read_csv_header(f, delimiter)
+            rows = islice(csv_rows(f, headers, delimiter, valid_movie_ids), count_lines or None)
+            if not batch_size:
+                yield from rows
+                return
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
                     break
-                if not line.strip():
-                    continue
-
-                values = [v.strip() for v in line.strip().split(delimiter)]
-                if len(values) != len(headers):
-                    continue    
-                row = dict(zip(headers, values))
+                yield batch
+    except FileNotFoundError:
+        print(f"Файл не найден: {file_path}")
+    except Exception as e:
+        print(f"Ошибка при чтении файла: {e}")
 
-                # фильтрация по movieId
-                if valid_movie_ids is not None:
-                    try:
-                        movie_id = int(row['movieId'])
-                        if movie_id not in valid_movie_ids:
-                            continue
-                    except Exception:
-                        continue  # Пропускаем если нет movieId или он не число
-
-                data.append(row)
-                line_count += 1
+def read_csv_header(file, delimiter=','):
+    """Reads and checks the header of ratings.csv or tags.csv."""
+    n1 = ['userId','movieId','rating','timestamp']
+    n2 = ['userId','movieId','tag','timestamp']
+    headers = [h.strip() for h in file.readline().strip().split(delimiter)]
+    if headers != n1 and headers != n2:
+        raise Exception("error header")
+    if (len(headers)) != 4:
+        raise Exception("Error")
+    return headers
+
+def csv_values(lines, headers, delimiter=',', valid_movie_ids=None):
+    """Yields the stripped fields of the lines after the header, skipped and filtered as in read_csv_as_dict."""
+    movie_id_index = headers.index('movieId')
+    movie_ids = MovieIdSet.of(valid_movie_ids)
+    if movie_ids is not None:
+        # фильтрация по movieId до разбора остальных полей
+        lines = movie_ids.select(lines, delimiter, movie_id_index)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        values = [v.strip() for v in line.split(delimiter)]
+        if len(values) != len(headers):
+            continue
+        if movie_ids is not None and not movie_ids[values[movie_id_index]]:
+            continue  # Пропускаем если нет movieId, он не число или не из списка
+
+        yield values
+
+def csv_rows(lines, headers, delimiter=',', valid_movie_ids=None):
+    """Yields the rows of read_csv_as_dict (dicts of strings) for lines after the header."""
+    for values in csv_values(lines, headers, delimiter, valid_movie_ids):
+        yield dict(zip(headers, values))
+
+def iter_csv_records(file_path, delimiter=',', encoding='utf-8', count_lines=None, valid_movie_ids=None):
+    """
+    Typed version of iter_csv_as_dict: yields Rating records for ratings.csv and Tag records for tags.csv,
+    with int ids and timestamps. Rows whose fields do not convert are reported and skipped.
+    """
+    try:
+        with open(file_path, 'r', encoding=encoding) as f:
+            headers = read_csv_header(f, delimiter)
+            record, value = (Rating, float) if headers[2] == 'rating' else (Tag, str)
+            for values in islice(csv_values(f, headers, delimiter, valid_movie_ids), count_lines or None):
+                try:
+                    yield record(int(values[0]), int(values[1]), value(values[2]), int(values[3]))
+                except ValueError as e:
+                    print(f"Ошибка при чтении файла: {e}")
     except FileNotFoundError:
         print(f"Файл не найден: {file_path}")
     except Exception as e:
         print(f"Ошибка при чтении файла: {e}")
 
-    return data
+def read_in_chunks(file, chunk_size=1 << 20):
+    """
+    Yields the remaining lines of an open file in lists of about chunk_size characters,
+    so a file of any size is processed in bounded memory.
+    """
+    while True:
+        lines = file.readlines(chunk_size)
+        if not lines:
+            return
+        yield lines
+
+def split_file(file_path, start, parts):
+    """
+    Splits the file from byte offset start into about parts byte ranges (start, end).
+    Every range ends right after a newline, so no line is cut between two ranges.
+    """
+    size = os.path.getsize(file_path)
+    bounds = [start]
+    with open(file_path, 'rb') as f:
+        for i in range(1, parts):
+            position = start + (size - start) * i // parts
+            if position <= bounds[-1]:
+                continue
+            # если байт перед position - перевод строки, граница остаётся на месте
+            f.seek(position - 1)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(max(size, start))
+    return list(zip(bounds, bounds[1:]))
+
+def read_lines(file_path, start, end, encoding='utf-8'):
+    """Lines of the byte range [start, end) of a file, with newlines translated as in text mode."""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return io.StringIO(data.decode(encoding), newline=None)
+
+def header_end(file_path):
+    """Byte offset of the first line after the header."""
+    with open(file_path, 'rb') as f:
+        f.readline()
+        return f.tell()
+
+def map_file_ranges(function, file_path, start, workers, *args):
+    """
+    Runs function(file_path, start, end, *args) for byte ranges of the file in a pool of workers processes
+    and yields the results in file order. There are several ranges per process, so a slow one does not
+    keep the others idle.
+    """
+    ranges = split_file(file_path, start, workers * 4)
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(function, repeat(file_path), *zip(*ranges), *(repeat(arg) for arg in args))
+
+def load_stats(rows, started):
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else 0
+    }
+
+def top_n(items, n, key=None, reverse=True):
+    """
+    Same result as sorted(items, key=key, reverse=reverse)[:n], but in O(N log n):
+    heapq keeps equal keys in their original order, so ties are broken the same way.
+    """
+    if n is None or n < 0:
+        return sorted(items, key=key, reverse=reverse)[:n]
+    if n == 0:
+        return []
+    if reverse:
+        return heapq.nlargest(n, items, key=key)
+    return heapq.nsmallest(n, items, key=key)
 
 def mean(lst):
     return sum(lst) / len(lst) if lst else 0
@@ -87,17 +227,773 @@ def variance(lst):
     avg = mean(lst)
     return sum((x - avg) ** 2 for x in lst) / (n - 1)
 
+class Record:
+    """
+    Base of the compact row types: fields live in __slots__, not in a dict per row.
+    Records are read-only: catalogs share them and index them by id, title and year.
+    For the code written against dict rows a record also supports row["movieId"], row.get(),
+    keys()/values()/items(), dict(row), and compares equal to the dict with the same items.
+    """
+    __slots__ = ()
+    KEYS = {}  # имя колонки CSV -> атрибут
+
+    def __init_subclass__(cls):
+        # дескрипторы слотов: запись в обход __setattr__, только из __init__
+        cls._setters = tuple(getattr(cls, attribute).__set__ for attribute in cls.__slots__)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __reduce__(self):
+        # pickle и copy восстанавливают запись через __init__, а не через setattr
+        return type(self), tuple(self.values())
+
+    def __getitem__(self, key):
+        return getattr(self, self.KEYS[key])
+
+    def get(self, key, default=None):
+        attribute = self.KEYS.get(key)
+        return default if attribute is None else getattr(self, attribute)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def keys(self):
+        return self.KEYS.keys()
+
+    def values(self):
+        return [getattr(self, attribute) for attribute in self.__slots__]
+
+    def items(self):
+        return list(zip(self.KEYS, self.values()))
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.values() == other.values()
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None  # как у dict: равны словарям, а список genres изменяемый
+
+    def __repr__(self):
+        fields = ", ".join(f"{attribute}={getattr(self, attribute)!r}" for attribute in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Movie(Record):
+    __slots__ = ("movie_id", "title", "genres")
+    KEYS = {"movieId": "movie_id", "title": "title", "genres": "genres"}
+
+    def __init__(self, movie_id, title, genres):
+        set_movie_id, set_title, set_genres = self._setters
+        set_movie_id(self, movie_id)
+        set_title(self, title)
+        set_genres(self, genres)
+
+
+class Rating(Record):
+    __slots__ = ("user_id", "movie_id", "rating", "timestamp")
+    KEYS = {"userId": "user_id", "movieId": "movie_id", "rating": "rating", "timestamp": "timestamp"}
+
+    def __init__(self, user_id, movie_id, rating, timestamp):
+        set_user_id, set_movie_id, set_rating, set_timestamp = self._setters
+        set_user_id(self, user_id)
+        set_movie_id(self, movie_id)
+        set_rating(self, rating)
+        set_timestamp(self, timestamp)
+
+
+class Tag(Record):
+    __slots__ = ("user_id", "movie_id", "tag", "timestamp")
+    KEYS = {"userId": "user_id", "movieId": "movie_id", "tag": "tag", "timestamp": "timestamp"}
+
+    def __init__(self, user_id, movie_id, tag, timestamp):
+        set_user_id, set_movie_id, set_tag, set_timestamp = self._setters
+        set_user_id(self, user_id)
+        set_movie_id(self, movie_id)
+        set_tag(self, tag)
+        set_timestamp(self, timestamp)
+
+
+class Link(Record):
+    __slots__ = ("movie_id", "imdb_id", "tmdb_id")
+    KEYS = {"movieId": "movie_id", "imdbId": "imdb_id", "tmdbId": "tmdb_id"}
+
+    def __init__(self, movie_id, imdb_id, tmdb_id):
+        set_movie_id, set_imdb_id, set_tmdb_id = self._setters
+        set_movie_id(self, movie_id)
+        set_imdb_id(self, imdb_id)
+        set_tmdb_id(self, tmdb_id)
+
+
+class MovieIdSet(dict):
+    """
+    valid_movie_ids prepared for filtering raw CSV fields: movie_ids[field] is True if the movieId field
+    passes, with the same result as int(field) in valid_movie_ids.
+    The dict is filled with the decimal strings of the ids, so rows need no int(); a field written
+    differently ("007", " 7", "+7") is parsed once in __missing__ and its verdict is kept.
+    select() drops lines by their raw movieId before anything else in them is split or converted.
+    """
+    SAMPLE = 4096  # по стольким строкам select() решает, стоит ли отбирать строки заранее
+
+    def __init__(self, movie_ids):
+        # как в int(field) in valid_movie_ids: проходит любое число, равное целому (numpy.int64, 2.0, Fraction(4, 2))
+        self.ids = set()
+        for movie_id in movie_ids:
+            if not isinstance(movie_id, numbers.Number):
+                continue
+            try:
+                as_int = int(movie_id)
+            except (TypeError, ValueError, OverflowError):
+                continue  # nan, inf, complex
+            if as_int == movie_id:
+                self.ids.add(as_int)
+        self.ids = frozenset(self.ids)
+        super().__init__(dict.fromkeys(map(str, self.ids), True))
+        self[None] = False  # в строке нет поля movieId
+
+    @classmethod
+    def of(cls, movie_ids):
+        """None stays None (no filtering); a MovieIdSet is returned as is."""
+        if movie_ids is None or isinstance(movie_ids, cls):
+            return movie_ids
+        return cls(movie_ids)
+
+    def __missing__(self, field):
+        stripped = field.strip()
+        if stripped != field:
+            verdict = self[stripped]
+        elif field.isascii() and field.isdigit() and (field[0] != '0' or field == '0'):
+            verdict = False  # каноническая запись, все такие id уже есть в словаре
+        else:
+            try:
+                verdict = int(field) in self.ids
+            except ValueError:
+                verdict = False
+        self[field] = verdict
+        return verdict
+
+    def select(self, lines, delimiter=',', index=1, sample=None):
+        """
+        Lines whose field number index may be an accepted movieId, read lazily. It is only a prefilter:
+        callers still check the field of the split line.
+        If most of the first sample lines (SAMPLE by default, 0 - always filter) pass, the rest is passed
+        through unfiltered, because the extra split per line would cost more than it saves.
+        The choice is made per call, so one MovieIdSet can be reused for different files.
+        """
+        if delimiter.isspace():
+            # загрузчики делят строку после strip(); для разделителя-пробела это меняет номера полей
+            lines = map(str.strip, lines)
+        return self._select(iter(lines), delimiter, index, self.SAMPLE if sample is None else sample)
+
+    def _select(self, lines, delimiter, index, sample):
+        kept = 0
+        for line in islice(lines, sample):
+            parts = line.split(delimiter, index + 1)
+            if self[parts[index] if len(parts) > index else None]:
+                kept += 1
+                yield line
+        if 2 * kept > sample:
+            # не yield from: закрытие этого генератора не должно закрывать файл, из которого читаются строки
+            for line in lines:
+                yield line
+            return
+        for line in lines:
+            parts = line.split(delimiter, index + 1)
+            if self[parts[index] if len(parts) > index else None]:
+                yield line
+
+
+class RunningStats:
+    """
+    Streaming count/sum/mean/variance (Welford) in O(1) memory.
+    Partial results, e.g. from different chunks of a file, can be combined with merge().
+    """
+    __slots__ = ("count", "total", "mean", "m2")
+
+    def __init__(self, values=()):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        for x in values:
+            self.add(x)
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.total, self.mean, self.m2 = other.count, other.total, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.total += other.total
+        self.count = count
+        return self
+
+    def average(self):
+        # через сумму, как в mean(), чтобы результат совпадал до последнего знака
+        return self.total / self.count if self.count else 0
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count >= 2 else 0
+
+class RatingHistogram:
+    """
+    Counts of every distinct value. MovieLens ratings take only 10 half-star values,
+    so the exact median of any group costs O(1) memory. Histograms can be merged.
+    """
+    __slots__ = ("counts", "count")
+
+    def __init__(self, values=()):
+        self.counts = dict(Counter(values))
+        self.count = sum(self.counts.values())
+
+    def add(self, x):
+        self.counts[x] = self.counts.get(x, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self.count += other.count
+        return self
+
+    def __kth(self, k):
+        for value in sorted(self.counts):
+            k -= self.counts[value]
+            if k < 0:
+                return value
+
+    def median(self):
+        n = self.count
+        if n == 0:
+            return 0
+        mid = n // 2
+        if n % 2 == 0:
+            return (self.__kth(mid - 1) + self.__kth(mid)) / 2
+        return self.__kth(mid)
+
+class RateLimiter:
+    """
+    Lets at most `rate` calls per second through wait(); safe to share between threads.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class ImdbCache:
+    """
+    Persistent SQLite cache for IMDb data keyed by (imdbId, kind).
+    kind "html" holds the raw page, kind "record" the parsed fields of the page.
+    Values are stored zlib-compressed; entries older than ttl seconds are dropped,
+    and the least recently used entries are evicted once the values exceed max_bytes.
+    """
+    KINDS = ("html", "record")
+
+    def __init__(self, path="imdb_cache.sqlite", ttl=30 * 24 * 3600, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "imdb_id TEXT NOT NULL, kind TEXT NOT NULL, value BLOB NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (imdb_id, kind))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache (created)")
+            # общий размер значений поддерживается триггерами, чтобы не суммировать всю таблицу при каждой записи
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache_size (total INTEGER NOT NULL)")
+            if self._conn.execute("SELECT COUNT(*) FROM cache_size").fetchone()[0] == 0:
+                self._conn.execute("INSERT INTO cache_size SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache")
+            for event, change in (("INSERT", "+ LENGTH(new.value)"), ("DELETE", "- LENGTH(old.value)"),
+                                  ("UPDATE OF value", "- LENGTH(old.value) + LENGTH(new.value)")):
+                self._conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS cache_size_{event.split()[0].lower()} AFTER {event} ON cache "
+                    f"BEGIN UPDATE cache_size SET total = total {change}; END"
+                )
+
+    @staticmethod
+    def _encode(value, kind):
+        data = value if kind == "html" else json.dumps(value, ensure_ascii=False)
+        return zlib.compress(data.encode('utf-8'))
+
+    @staticmethod
+    def _decode(blob, kind):
+        data = zlib.decompress(blob).decode('utf-8')
+        return data if kind == "html" else json.loads(data)
+
+    def _check_kind(self, kind):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown cache kind: {kind}. Expected one of {self.KINDS}")
+
+    def get_many(self, imdb_ids, kind="html"):
+        """Returns {imdbId: value} for the ids that are cached and not expired."""
+        self._check_kind(kind)
+        imdb_ids = list(dict.fromkeys(imdb_ids))
+        now = time.time()
+        found = {}
+        with self._lock, self._conn:
+            for start in range(0, len(imdb_ids), 500):
+                batch = imdb_ids[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT imdb_id, value FROM cache WHERE kind = ? AND created >= ? AND imdb_id IN ({marks})",
+                    [kind, now - self.ttl, *batch]
+                ).fetchall()
+                for imdb_id, blob in rows:
+                    found[imdb_id] = self._decode(blob, kind)
+            self._conn.executemany(
+                "UPDATE cache SET accessed = ? WHERE imdb_id = ? AND kind = ?",
+                [(now, imdb_id, kind) for imdb_id in found]
+            )
+        return found
+
+    def get(self, imdb_id, kind="html"):
+        return self.get_many([imdb_id], kind).get(imdb_id)
+
+    def put_many(self, items, kind="html"):
+        """items: iterable of (imdbId, value)."""
+        self._check_kind(kind)
+        now = time.time()
+        rows = [(imdb_id, kind, self._encode(value, kind), now, now) for imdb_id, value in items]
+        with self._lock, self._conn:
+            # upsert, а не INSERT OR REPLACE: при замене строки срабатывает триггер UPDATE, и размер остаётся верным
+            self._conn.executemany(
+                "INSERT INTO cache VALUES (?, ?, ?, ?, ?) ON CONFLICT (imdb_id, kind) DO UPDATE SET "
+                "value = excluded.value, created = excluded.created, accessed = excluded.accessed", rows
+            )
+            self._evict(now)
+
+    def put(self, imdb_id, value, kind="html"):
+        self.put_many([(imdb_id, value)], kind)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT total FROM cache_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for imdb_id, kind, size in self._conn.execute(
+                "SELECT imdb_id, kind, LENGTH(value) FROM cache ORDER BY accessed, created"):
+            if total <= self.max_bytes:
+                break
+            stale.append((imdb_id, kind))
+            total -= size
+        self._conn.executemany("DELETE FROM cache WHERE imdb_id = ? AND kind = ?", stale)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ImdbFetcher:
+    """
+    Downloads IMDb title pages concurrently.
+    Uses one pooled requests.Session (keep-alive), a bounded thread pool,
+    per-host rate limiting and retries with exponential backoff.
+    With an ImdbCache, pages are served from the cache and downloaded pages are stored in it.
+    """
+    URL = 'https://www.imdb.com/title/tt{}/'
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
+        'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+        'Referer': 'https://www.imdb.com/title/',
+        'Upgrade-Insecure-Requests': '1'
+    }
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_workers=8, requests_per_second=5.0, retries=3, backoff=0.5, timeout=10, url=None,
+                 cache=None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.requests_per_second = requests_per_second
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.url = url or self.URL
+        self.session = requests.Session()
+        self.session.headers.update(self.HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Closes the session and the cache."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.requests_per_second)
+            return self._limiters[host]
+
+    def fetch(self, imdb_id):
+        """
+        Returns the html of one title page. Raises Exception when the page can not be downloaded.
+        """
+        url = self.url.format(imdb_id)
+        limiter = self._limiter(url)
+        for attempt in range(self.retries + 1):
+            limiter.wait()
+            try:
+                page = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise Exception(f'Error page: {e}')
+            else:
+                if page.status_code == 200:
+                    return page.text
+                if page.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                    raise Exception(f'Error page: {page.status_code}')
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch_many(self, imdb_ids):
+        """
+        Downloads all pages with at most max_workers requests in flight.
+        Returns a list of (imdbId, html, error) in the order of imdb_ids; html is None if the download failed.
+        """
+        imdb_ids = list(imdb_ids)
+        cached = self.cache.get_many(imdb_ids, "html") if self.cache is not None else {}
+        missing = list(dict.fromkeys(imdb_id for imdb_id in imdb_ids if imdb_id not in cached))
+        downloaded = {}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                futures = [pool.submit(self.fetch, imdb_id) for imdb_id in missing]
+                for imdb_id, future in zip(missing, futures):
+                    try:
+                        downloaded[imdb_id] = (future.result(), None)
+                    except Exception as e:
+                        downloaded[imdb_id] = (None, e)
+            if self.cache is not None:
+                self.cache.put_many(((imdb_id, html) for imdb_id, (html, error) in downloaded.items()
+                                     if error is None), "html")
+        results = []
+        for imdb_id in imdb_ids:
+            if imdb_id in cached:
+                results.append((imdb_id, cached[imdb_id], None))
+            else:
+                results.append((imdb_id, *downloaded[imdb_id]))
+        return results
+
+
+class _Comment(str):
+    pass
+
+
+class ImdbPageParser(HTMLParser):
+    """
+    Extracts the data of an IMDb title page in one streaming pass of html.parser events.
+    Only the few elements that hold the data (h1, title, credit/runtime/box-office items,
+    the element after "IMDb RATING") are kept as small subtrees, the rest of the page is skipped.
+    Results are the same as the former BeautifulSoup find()/find_next() code (legacy_soup_parse in benchmarks.py).
+    """
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                 'param', 'source', 'track', 'wbr'}
+    BOXOFFICE = re.compile(r'title-boxoffice.*')
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._tags = []      # открытые теги
+        self._nodes = []     # узлы собираемых поддеревьев, параллельно _tags (None - не собираем)
+        self._text = []
+        self._after_rating = False
+        self.h1 = self.title = self.credit = self.runtime = self.rating = None
+        self.boxoffice_exact = []
+        self.boxoffice_other = []
+
+    @classmethod
+    def parse(cls, html):
+        parser = cls()
+        parser.feed(html)
+        parser.close()
+        return parser.record()
+
+    # --- события парсера ---
+
+    def _flush(self):
+        if not self._text:
+            return
+        text = ''.join(self._text)
+        self._text = []
+        # как BeautifulSoup: строка из одних пробелов схлопывается в ' ' или '\n'
+        if not text.strip(self.ASCII_SPACES) and 'pre' not in self._tags and 'textarea' not in self._tags:
+            text = '\n' if '\n' in text else ' '
+        if self._nodes and self._nodes[-1] is not None:
+            self._nodes[-1][1].append(text)
+        if self.rating is None and not self._after_rating and text == 'IMDb RATING':
+            self._after_rating = True
+
+    def _open(self, tag, attrs):
+        self._flush()
+        parent = self._nodes[-1] if self._nodes else None
+        node = [tag, []] if parent is not None else None
+        is_root = self._check_root(tag, attrs)
+        if is_root and node is None:
+            node = [tag, []]
+        if parent is not None:
+            parent[1].append(node)
+        if is_root:
+            self._register(node, tag, attrs)
+        return node
+
+    def _check_root(self, tag, attrs):
+        if self._after_rating:
+            return True
+        if tag == 'h1':
+            return self.h1 is None
+        if tag == 'title':
+            return self.title is None
+        if tag == 'li':
+            testid = dict(attrs).get('data-testid')
+            if testid is None:
+                return False
+            return (testid == 'title-pc-principal-credit' and self.credit is None
+                    or testid == 'title-techspec_runtime' and self.runtime is None
+                    or self.BOXOFFICE.search(testid) is not None)
+        return False
+
+    def _register(self, node, tag, attrs):
+        if self._after_rating:
+            self._after_rating = False
+            self.rating = node
+        if tag == 'h1' and self.h1 is None:
+            self.h1 = node
+        elif tag == 'title' and self.title is None:
+            self.title = node
+        elif tag == 'li':
+            testid = dict(attrs).get('data-testid')
+            if testid == 'title-pc-principal-credit' and self.credit is None:
+                self.credit = node
+            elif testid == 'title-techspec_runtime' and self.runtime is None:
+                self.runtime = node
+            if testid == 'title-boxoffice-section':
+                self.boxoffice_exact.append(node)
+            if testid is not None and self.BOXOFFICE.search(testid):
+                self.boxoffice_other.append(node)
+
+    def handle_starttag(self, tag, attrs):
+        node = self._open(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self._tags.append(tag)
+            self._nodes.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag not in self._tags:
+            return
+        while self._tags:
+            self._nodes.pop()
+            if self._tags.pop() == tag:
+                break
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+        if self._nodes and self._nodes[-1] is not None:
+            self._nodes[-1][1].append(_Comment(data))
+        # BeautifulSoup находит метку рейтинга и в комментариях
+        if self.rating is None and not self._after_rating and data == 'IMDb RATING':
+            self._after_rating = True
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    # --- извлечение полей из собранных поддеревьев ---
+
+    @staticmethod
+    def _text_of(node):
+        parts = []
+        for child in node[1]:
+            if isinstance(child, list):
+                # текст скриптов и стилей внутри элемента в .text не входит
+                if child[0] not in ('script', 'style', 'template'):
+                    parts.append(ImdbPageParser._text_of(child))
+            elif not isinstance(child, _Comment):
+                parts.append(child)
+        return ''.join(parts)
+
+    @staticmethod
+    def _string_of(node):
+        if len(node[1]) != 1:
+            return None
+        child = node[1][0]
+        return ImdbPageParser._string_of(child) if isinstance(child, list) else child
+
+    @staticmethod
+    def _descendants(node, tag):
+        for child in node[1]:
+            if isinstance(child, list):
+                if child[0] == tag:
+                    yield child
+                yield from ImdbPageParser._descendants(child, tag)
+
+    def record(self):
+        dic = {
+            'Director': 'Unknown',
+            'Budget': '0',
+            'Gross worldwide': '0',
+            'Gross US & Canada': '0',
+            'Opening weekend US & Canada': '0',
+            'Runtime': '0',
+            'Title': '-'
+        }
+        if self.h1 is not None:
+            dic['Title'] = self._text_of(self.h1).strip()
+        if self.credit is not None:
+            link = next(self._descendants(self.credit, 'a'), None)
+            if link is not None:
+                dic['Director'] = self._text_of(link).strip()
+        if self.runtime is not None:
+            dic['Runtime'] = self._text_of(self.runtime).strip().replace("Runtime", "").strip()
+        for li in self.boxoffice_exact or self.boxoffice_other:
+            spans = list(self._descendants(li, 'span'))
+            if not spans:
+                break  # как и в версии на BeautifulSoup, обработка прерывается
+            key_span = next((span for span in spans if self._string_of(span) is not None), None)
+            if key_span is not None:
+                key = self._text_of(key_span).strip()
+                if key in dic:
+                    dic[key] = self._text_of(spans[-1]).strip()
+        dic['Rating'] = self._text_of(self.rating).strip()[:6] if self.rating is not None else None
+        dic['Page title'] = self._text_of(self.title) if self.title is not None else None
+        return dic
+
+
 class Links:
     """
     Analyzing data from links.csv
     """
+    # общий загрузчик страниц IMDb; его можно заменить, например, в тестах
+    # создаётся в get_fetcher() при первом обращении, а не при импорте модуля
+    fetcher = None
+    _fetcher_lock = threading.Lock()
+    # версия записей parse_page в кэше; увеличивается, когда меняется набор полей записи
+    RECORD_VERSION = 2
+
+    @staticmethod
+    def enable_cache(path="imdb_cache.sqlite", **kwargs):
+        """
+        Keeps downloaded pages and parsed records in a persistent ImdbCache,
+        so repeated runs do not go to the network.
+        """
+        fetcher = Links.get_fetcher()
+        cache = ImdbCache(path, **kwargs)
+        with Links._fetcher_lock:
+            previous, fetcher.cache = fetcher.cache, cache
+        if previous is not None:
+            previous.close()
+        return cache
+
+    @staticmethod
+    def get_fetcher():
+        """
+        The shared ImdbFetcher, created on first use with an in-memory cache,
+        so get_imdb and get_imdb_rating for the same movies download each page once.
+        """
+        with Links._fetcher_lock:
+            if Links.fetcher is None:
+                Links.fetcher = ImdbFetcher(cache=ImdbCache(":memory:", max_bytes=64 * 1024 * 1024))
+            return Links.fetcher
+
+    @staticmethod
+    def reset_fetcher(fetcher=None):
+        """
+        Replaces the shared fetcher and closes the previous one with its session and cache.
+        With fetcher=None the default one is created again on first use.
+        """
+        with Links._fetcher_lock:
+            previous, Links.fetcher = Links.fetcher, fetcher
+        if previous is not None and previous is not fetcher:
+            previous.close()
+
     def __init__(self, path_to_the_file):
         """
         Put here any fields that you think you will need.
         """
         self._path_to_the_file = path_to_the_file
         self.dict_file = Links.read_csv_column(path_to_the_file, 'imdbId')
-        self.imdb_info = self.__imdb_getter()
+        # данные IMDb скачиваются при первом обращении к imdb_info или в prefetch()
+        self._imdb_info = None
+
+    @classmethod
+    def _from_column(cls, imdb_ids, path_to_the_file=None):
+        links = cls.__new__(cls)
+        links._path_to_the_file = path_to_the_file
+        links.dict_file = imdb_ids
+        links._imdb_info = None
+        return links
+
+    @property
+    def imdb_info(self):
+        if self._imdb_info is None:
+            self.prefetch()
+        return self._imdb_info
+
+    def prefetch(self):
+        """
+        Downloads the IMDb data right away instead of on the first access to imdb_info.
+        """
+        self._imdb_info = self.__imdb_getter()
+        return self._imdb_info
 
     @staticmethod
     def read_csv_column(file_path, column_name, valid_movie_ids=None):
@@ -115,8 +1011,13 @@ class Links:
 
                 column_index = headers.index(column_name)
                 movie_id_index = headers.index("movieId") if valid_movie_ids is not None else None
+                lines = file
+                movie_ids = MovieIdSet.of(valid_movie_ids)
+                if movie_ids is not None:
+                    # movieId проверяется до разбора всей строки
+                    lines = movie_ids.select(file, ',', movie_id_index)
 
-                for line in file:
+                for line in lines:
                     line = line.strip()
                     row = line.split(',')
 
@@ -124,15 +1025,8 @@ class Links:
                     if len(row) != 3:
                         continue
 
-                    if valid_movie_ids is not None:
-                        try:
-                            movie_id = int(row[movie_id_index])
-                            if movie_id not in valid_movie_ids:
-                                continue
-                        except Exception:
-                            continue  # Пропуск некорректного movieId
-
-
+                    if movie_ids is not None and not movie_ids[row[movie_id_index]]:
+                        continue  # Пропуск некорректного movieId
 
                     value = row[column_index].strip()
                     values.append(value)
@@ -144,6 +1038,44 @@ class Links:
 
         return values
 
+    @staticmethod
+    def read_csv_records(file_path, valid_movie_ids=None):
+        """
+        All rows of links.csv as Link records: int movieId, imdbId as in the file (with leading zeros),
+        int tmdbId or None when it is empty. Rows are skipped by the same rules as in read_csv_column.
+        """
+        records = []
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                headers = file.readline().strip().split(',')
+                if headers != ["movieId", "imdbId", "tmdbId"]:
+                    raise ValueError("Invalid CSV structure. Expected columns: 'movieId,imdbId,tmdbId'")
+
+                lines = file
+                movie_ids = MovieIdSet.of(valid_movie_ids)
+                if movie_ids is not None:
+                    lines = movie_ids.select(file, ',', 0)
+                for line in lines:
+                    row = line.strip().split(',')
+                    if len(row) != 3:
+                        continue
+                    try:
+                        movie_id = int(row[0])
+                        tmdb_id = row[2].strip()
+                        tmdb_id = int(tmdb_id) if tmdb_id else None
+                    except ValueError:
+                        continue
+                    if movie_ids is not None and not movie_ids[row[0]]:
+                        continue
+                    records.append(Link(movie_id, row[1].strip(), tmdb_id))
+
+        except FileNotFoundError:
+            print(f"File '{file_path}' not found.")
+        except Exception as e:
+            print(f"An error occurred while reading the file: {e}")
+
+        return records
+
     def __imdb_getter(self):
         list_of_movies = self.dict_file[:10]
         list_of_fields = ['Director', 'Budget', 'Gross worldwide', 'Gross US & Canada', 
@@ -151,87 +1083,51 @@ class Links:
         return Links.get_imdb(list_of_movies, list_of_fields)
     
     @staticmethod
-    def __Connection(imdbId):
-        url = f'https://www.imdb.com/title/tt{imdbId}/'
-        headers = { 
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Referer': 'https://www.imdb.com/title/',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        page = requests.get(url, headers=headers)
-        if page.status_code != 200:
-            raise Exception(f'Error page: {page.status_code}')
-        return page
-    
-    @staticmethod
-    def __Make_dict(soup):
-        dic = {
-            'Director': 'Unknown',
-            'Budget': '0',
-            'Gross worldwide': '0',
-            'Gross US & Canada': '0',
-            'Opening weekend US & Canada': '0',
-            'Runtime': '0',
-            'Title': '-'
-        }
-
-        # Title
-        try:
-            title_tag = soup.find('h1')
-            if title_tag:
-                dic['Title'] = title_tag.text.strip()
-        except:
-            pass
-
-        # Director
-        try:
-            director_section = soup.find('li', {'data-testid': 'title-pc-principal-credit'})
-            if director_section:
-                director_link = director_section.find('a')
-                if director_link:
-                    dic['Director'] = director_link.text.strip()
-        except:
-            pass
-
-        # Runtime
-        try:
-            runtime_li = soup.find('li', {'data-testid': 'title-techspec_runtime'})
-            if runtime_li:
-                runtime_text = runtime_li.text.strip()
-                runtime_clean = runtime_text.replace("Runtime", "").strip()
-                dic['Runtime'] = runtime_clean
-        except:
-            pass
-
-        # Box office section
-        try:
-            box_office_section = soup.find_all('li', {'data-testid': 'title-boxoffice-section'})
-            if not box_office_section:
-                box_office_section = soup.find_all('li', {'data-testid': re.compile(r'title-boxoffice.*')})
-            for li in box_office_section:
-                key_span = li.find('span', string=True)
-                val_span = li.find_all('span')[-1]
-                if key_span and val_span:
-                    key = key_span.text.strip()
-                    val = val_span.text.strip()
-                    if key in dic:
-                        dic[key] = val
-        except:
-            pass
+    def parse_page(html):
+        """
+        Returns the fields of an IMDb page: Director, Budget, the gross fields, Runtime and Title,
+        plus 'Rating' and 'Page title'.
+        """
+        return ImdbPageParser.parse(html)
 
-        return dic
-    
     @staticmethod
-    def __extract_rating(soup):
-        try:
-            rating_label = soup.find(string='IMDb RATING')
-            if not rating_label:
-                return None
-            rating = rating_label.find_next().text.strip()[:6]
-            return rating
-        except AttributeError:
-            return None
+    def get_imdb_records(list_of_movies, list_of_fields=None):
+        """
+        Returns {movieId: record} for the movies whose IMDb pages could be loaded, in the order of list_of_movies.
+        Each page is downloaded and parsed once; the record holds every field of parse_page
+        or only list_of_fields when it is given. get_imdb and get_imdb_rating are projections of these records.
+        """
+        list_of_movies = list(dict.fromkeys(list_of_movies))
+        fetcher = Links.get_fetcher()
+        cache = fetcher.cache
+        records = {}
+        if cache is not None:
+            # записи другой версии (например, без 'Rating' и 'Page title') считаются промахом и скачиваются заново
+            for id, entry in cache.get_many(list_of_movies, "record").items():
+                if isinstance(entry, dict) and entry.get("version") == Links.RECORD_VERSION:
+                    records[id] = entry["record"]
+        missing = [id for id in list_of_movies if id not in records]
+        parsed = {}
+        for id, html, error in fetcher.fetch_many(missing):
+            try:
+                if error is not None:
+                    raise error
+                parsed[id] = Links.parse_page(html)
+            except Exception as e:
+                print(f"Error fetching data for movie ID {id}: {e}")
+        if cache is not None and parsed:
+            cache.put_many(((id, {"version": Links.RECORD_VERSION, "record": record})
+                            for id, record in parsed.items()), "record")
+        records.update(parsed)
+        result = {}
+        for id in list_of_movies:
+            if id not in records:
+                continue
+            record = records[id]
+            if list_of_fields is not None:
+                record = {field: record[field] for field in list_of_fields}
+            result[id] = record
+        return result
 
     @staticmethod
     def get_imdb(list_of_movies, list_of_fields):
@@ -242,17 +1138,17 @@ class Links:
         Sort it by movieId descendingly.
         """
         imdb_info = []
-        superdict = {}
-        try:
-            for id in list_of_movies:
-                page = Links.__Connection(id)
-                soup = BeautifulSoup(page.text, "html.parser")
-                superdict = Links.__Make_dict(soup)
+        records = Links.get_imdb_records(list_of_movies)
+        for id in list_of_movies:
+            if id not in records:
+                continue
+            try:
+                superdict = records[id]
                 appended_list = [superdict[field] for field in list_of_fields]
                 appended_list.insert(0,id)
                 imdb_info.append(appended_list)
-        except Exception as e:
-            print(f"Error: {e}") 
+            except Exception as e:
+                print(f"Error: {e}") 
         sorted_data = sorted(imdb_info, key=lambda x: x[0], reverse=True)
         return sorted_data
         
@@ -268,7 +1164,7 @@ class Links:
             else:
                 directors[i[1]] += 1
 
-        return dict(sorted(directors.items(), key=lambda x: x[1], reverse=True)[:n])
+        return dict(top_n(directors.items(), n, key=lambda x: x[1]))
         
     def most_expensive(self, n):
         """
@@ -280,7 +1176,7 @@ class Links:
             budget = float(''.join(filter(str.isdigit, i[2]))) 
             budgets[i[7]] = budget
 
-        return dict(sorted(budgets.items(), key=lambda x: x[1], reverse=True)[:n])
+        return dict(top_n(budgets.items(), n, key=lambda x: x[1]))
         
     def most_profitable(self, n):
         """
@@ -294,7 +1190,7 @@ class Links:
             budget = float(''.join(filter(str.isdigit, i[2])))
             profits[i[7]] = gross_worldwide - budget
 
-        return dict(sorted(profits.items(), key=lambda x: x[1], reverse=True)[:n])
+        return dict(top_n(profits.items(), n, key=lambda x: x[1]))
         
     @staticmethod
     def parse_runtime(runtime_str):
@@ -347,7 +1243,7 @@ class Links:
 
             parsed.append((title, total_minutes))
 
-        top = sorted(parsed, key=lambda x: x[1], reverse=True)[:n]
+        top = top_n(parsed, n, key=lambda x: x[1])
         return dict(top)
         
     def top_cost_per_minute(self, n):
@@ -362,124 +1258,286 @@ the values are the budgets divided by their runtime. The budgets can be in diffe
             budget = float(''.join(filter(str.isdigit, i[2])))
             costs[i[7]] = budget / mins
 
-        return dict(sorted(costs.items(), key=lambda x: x[1], reverse=True)[:n])
+        return dict(top_n(costs.items(), n, key=lambda x: x[1]))
     
 
     @staticmethod
     def get_imdb_rating(list_of_movies):
         rating_info = []
+        records = Links.get_imdb_records(list_of_movies, ['Page title', 'Rating'])
 
         for movie_id in list_of_movies:
-            try:
+            if movie_id not in records:
+                continue
+            page = records[movie_id]
 
-                response = Links.__Connection(movie_id)
-                soup = BeautifulSoup(response.text, "html.parser")
+            if page['Page title'] is not None:
+                full_title = page['Page title'].strip()
+                movie_name = full_title.replace(' - IMDb', '').split('(')[0].strip()
+            else:
+                movie_name = "Unknown Title"
 
-                #parsed_data = Links.__Make_dict(soup)
+            rating = page['Rating']
 
-                title_div = soup.find('title')
-                if title_div:
-                    full_title = title_div.text.strip()
-                    movie_name = full_title.replace(' - IMDb', '').split('(')[0].strip()
-                else:
-                    movie_name = "Unknown Title"
+            rating_info.append([movie_id, movie_name, rating])
 
-                rating = Links.__extract_rating(soup)  
+        rating_info.sort(key=lambda x: x[2] if x[2] is not None else 0, reverse=True)
+        return rating_info
 
-                rating_info.append([movie_id, movie_name, rating])
 
-            except Exception as e:
-                print(f"Error fetching data for movie ID {movie_id}: {e}")
+class MovieCatalog:
+    """
+    Parsed movies.csv: the list of movies {movieId, title, genres} and lookups over it.
+    Movies, Ratings and their subclasses share one catalog per file:
+    MovieCatalog.load memoizes catalogs process-wide by (path, size, mtime, max_lines).
+    """
+    HEADER = "movieId,title,genres"
+    _loaded = {}
+    _lock = threading.Lock()
+
+    YEAR_RE = re.compile(r"\((\d{4})\)")
+    # "Title (1995)" с единственной открывающей скобкой
+    TITLE_YEAR_RE = re.compile(r"[^(]*\((\d{4})\)")
+    # артикли, которые MovieLens переносит в конец названия: "Matrix, The (1999)"
+    ARTICLES = ("the", "a", "an", "les", "la", "le", "l'", "il", "el", "los", "las", "der", "die", "das")
+    TITLE_KEY_RE = re.compile(r"(.*?)\s*(\(\d{4}\))?")
+
+    def __init__(self, movies):
+        self.movies = movies
+        self.by_id = {m.movie_id: m for m in movies}
+        self.titles = {m.movie_id: m.title for m in movies}
+        # годы из названий разбираются один раз при загрузке, 0 - года нет
+        self.year = array('H')          # как Ratings.extract_year_from_title (последние скобки)
+        self.release_year = array('H')  # первое "(dddd)" в названии, как в Movies.dist_by_release
+        self.year_index = defaultdict(list)  # год -> фильмы, в названии которых есть "(год)"
+        self.genre_bits = {}                  # жанр -> бит в маске жанров
+        self.genre_index = defaultdict(list)  # жанр -> фильмы этого жанра
+        masks = []
+        # маска считается один раз на комбинацию жанров
+        genre_sets = {}
+        title_year = self.TITLE_YEAR_RE.fullmatch
+        for movie in movies:
+            genres = tuple(movie.genres)
+            known = genre_sets.get(genres)
+            if known is None:
+                unique = tuple(dict.fromkeys(genres))
+                known = genre_sets[genres] = (self.genre_mask_of(unique, add=True), unique)
+            masks.append(known[0])
+            for genre in known[1]:
+                self.genre_index[genre].append(movie)
+
+            title = movie.title
+            match = title_year(title)
+            if match:
+                # обычный случай "Title (1995)": все три правила дают один год
+                year = release = int(match[1])
+                found = (year,)
+            else:
+                found = tuple(dict.fromkeys(int(y) for y in self.YEAR_RE.findall(title)))
+                year = Ratings.extract_year_from_title(title) or 0
+                release = found[0] if found else 0
+            self.year.append(year)
+            self.release_year.append(release)
+            for y in found:
+                self.year_index[y].append(movie)
+        self.year_index = dict(self.year_index)
+        self.genre_index = dict(self.genre_index)
+        # в MovieLens 20 жанров, маска помещается в 64 бита
+        self.genre_mask = array('Q', masks) if len(self.genre_bits) <= 64 else masks
+        self._years = None
+        self._genres = None
+        self._release_counts = None
+        self._title_index = None
+        self._title_keys = None
+
+    @property
+    def genres(self):
+        # movieId -> жанры, считается один раз на каталог
+        if self._genres is None:
+            self._genres = {m.movie_id: m.genres for m in self.movies}
+        return self._genres
+
+    @property
+    def years(self):
+        # movieId -> год из названия, только для фильмов, где год указан
+        if self._years is None:
+            self._years = {m.movie_id: year for m, year in zip(self.movies, self.year) if year}
+        return self._years
+
+    @property
+    def release_counts(self):
+        # год выпуска (строкой) -> число фильмов, в порядке первого появления в каталоге
+        if self._release_counts is None:
+            counts = defaultdict(int)
+            for year in self.release_year:
+                if year:
+                    counts[str(year)] += 1
+            self._release_counts = dict(counts)
+        return self._release_counts
 
-        rating_info.sort(key=lambda x: x[2] if x[2] is not None else 0, reverse=True)
-        return rating_info
+    def movie_ids_by_year(self, year):
+        return [m.movie_id for m in self.year_index.get(year, [])]
 
+    @classmethod
+    def title_key(cls, title):
+        """
+        Normalized title for fuzzy lookups: case-folded, single spaces, without a leading
+        or trailing article, so "Matrix, The (1999)" and "the matrix (1999)" get one key.
+        """
+        base, year = cls.TITLE_KEY_RE.fullmatch(" ".join(title.casefold().split())).groups()
+        head, sep, tail = base.rpartition(", ")
+        if sep and tail in cls.ARTICLES:
+            base = head
+        else:
+            first, sep, rest = base.partition(" ")
+            if sep and first in cls.ARTICLES:
+                base = rest
+            elif base.startswith("l'"):
+                base = base[2:]
+        return f"{base} {year}" if year else base
+
+    def movie_id_by_title(self, title, fuzzy=False):
+        """
+        movieId of the first movie with this title (case-insensitive), or None.
+        With fuzzy=True a title that does not match exactly is looked up by title_key.
+        """
+        if self._title_index is None:
+            self._title_index = {}
+            for movie in self.movies:
+                self._title_index.setdefault(movie.title.lower(), movie.movie_id)
+        movie_id = self._title_index.get(title.lower())
+        if movie_id is None and fuzzy:
+            if self._title_keys is None:
+                self._title_keys = {}
+                for movie in self.movies:
+                    self._title_keys.setdefault(self.title_key(movie.title), movie.movie_id)
+            movie_id = self._title_keys.get(self.title_key(title))
+        return movie_id
+
+    def movie_ids_by_titles(self, titles, fuzzy=False):
+        return {title: self.movie_id_by_title(title, fuzzy) for title in titles}
+
+    def movie_ids_by_genre(self, genre):
+        return [m.movie_id for m in self.genre_index.get(genre, [])]
+
+    def genre_mask_of(self, genres, add=False):
+        """Bitmask of genres; unknown genres get a new bit with add=True and are ignored otherwise."""
+        mask = 0
+        for genre in genres:
+            bit = self.genre_bits.get(genre)
+            if bit is None:
+                if not add:
+                    continue
+                bit = self.genre_bits[genre] = 1 << len(self.genre_bits)
+            mask |= bit
+        return mask
 
-class Movies:
-    def __init__(self, path_to_file):
-        self._path = path_to_file
-        self.movies_list = self.__load_file(max_lines=1000)
-        self.movies_dict = {m["movieId"]: m for m in self.movies_list}
+    def genre_names(self, mask):
+        return sorted(genre for genre, bit in self.genre_bits.items() if mask & bit)
 
-    def __load_file(self, max_lines=1000):
+    @classmethod
+    def load(cls, path, max_lines=None):
+        """
+        Returns the catalog of path, parsing the file only if it is not loaded yet
+        or has changed (size or mtime) since it was loaded.
+        """
+        max_lines = max_lines or None  # 0, как и None, - без ограничения
+        try:
+            st = os.stat(path)
+        except OSError:
+            return cls(cls.parse(path, max_lines))
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, max_lines)
+        with cls._lock:
+            catalog = cls._loaded.get(key)
+            if catalog is None:
+                catalog = cls(cls.parse(path, max_lines))
+                # прежние версии того же файла больше не нужны: в памяти остаётся только последний каталог
+                for old in [k for k in cls._loaded if k[0] == key[0] and k[3] == max_lines]:
+                    del cls._loaded[old]
+                cls._loaded[key] = catalog
+        return catalog
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._loaded.clear()
+
+    @staticmethod
+    def parse(path, max_lines=None):
+        """
+        Reads movies.csv with the csv module (RFC 4180 quoting: commas, quotes and newlines in titles).
+        max_lines limits the number of records read after the header; None or 0 reads every record.
+        """
         movies = []
         try:
-            with open(self._path, 'r', encoding='utf-8') as file:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
                 header = file.readline().strip()
-                if header != "movieId,title,genres":
+                if header != MovieCatalog.HEADER:
                     raise ValueError("Invalid file structure. Expected header: 'movieId,title,genres'")
-                for line_number, line in enumerate(file, start=1):
-                    if max_lines is not None and line_number > max_lines:
-                        break  # достигли лимит строк
-
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    # Отделяем жанры с конца строки
-                    last_comma = line.rfind(',')
-                    if last_comma == -1:
-                        continue  # строка некорректна
-
-                    genres_str = line[last_comma + 1:].strip()
-                    left = line[:last_comma]
-
-                    # Теперь отделим movieId и title
-                    first_comma = left.find(',')
-                    if first_comma == -1:
-                        continue
-                    movie_id_str = left[:first_comma].strip()
-
-                    title = left[first_comma + 1:].strip()
-                    if '"' in title:
-                        if title.split('"')[0] != '' or title.split('"')[-1] != '':
-                            continue
+                # комбинаций жанров в каталоге немного: строка жанров разбирается один раз,
+                # но каждый фильм получает свою копию списка, чтобы изменение жанров одного фильма не меняло другие
+                genre_lists = {}
+                for row in islice(csv.reader(file), max_lines or None):
+                    if len(row) == 3:
+                        movie_id, title, genres_str = row
+                    elif len(row) > 3:
+                        # запятая в названии без кавычек - название занимает все средние поля
+                        movie_id, title, genres_str = row[0], ','.join(row[1:-1]), row[-1]
                     else:
-                        if len(title.split(',')) != 1:
-                            continue
-                    title = title.strip('"')
-
-                    genres = [g.strip() for g in genres_str.split('|')] if genres_str else []
-
+                        continue  # пустая или некорректная строка
                     try:
-                        movies.append({
-                            "movieId": int(movie_id_str),
-                            "title": title,
-                            "genres": genres
-                        })
+                        movie_id = int(movie_id)
                     except ValueError:
                         continue
+                    genres = genre_lists.get(genres_str)
+                    if genres is None:
+                        genres = [g.strip() for g in genres_str.split('|')] if genres_str.strip() else []
+                        genre_lists[genres_str] = genres
+                    movies.append(Movie(movie_id, title.strip(), genres[:]))
 
         except Exception as e:
             print(f"Ошибка при чтении файла Movies: {e}")
         return movies
 
+
+class Movies:
+    def __init__(self, path_to_file, max_lines=None):
+        self._path = path_to_file
+        self._attach_catalog(MovieCatalog.load(path_to_file, max_lines))
+
+    @classmethod
+    def _from_catalog(cls, catalog, path_to_file=None):
+        movies = cls.__new__(cls)
+        movies._path = path_to_file
+        movies._attach_catalog(catalog)
+        return movies
+
+    def _attach_catalog(self, catalog):
+        self.catalog = catalog
+        self.movies_list = list(catalog.movies)
+        self.movies_dict = dict(catalog.by_id)
+
+    def __load_file(self, max_lines=None):
+        return list(MovieCatalog.load(self._path, max_lines).movies)
+
     def get_movies(self):
         return self.movies_list
     
-    def get_movie_id_by_title(self, title):
-        for movie in self.movies_list:
-            if movie.get("title", "").lower() == title.lower():
-                return int(movie["movieId"])
-        return None
+    def get_movie_id_by_title(self, title, fuzzy=False):
+        return self.catalog.movie_id_by_title(title, fuzzy)
+
+    def get_movie_ids_by_titles(self, titles, fuzzy=False):
+        """Returns {title: movieId or None} for a batch of titles."""
+        return self.catalog.movie_ids_by_titles(titles, fuzzy)
 
     def dist_by_release(self):
-        release_years = defaultdict(int)
-        for movie in self.movies_list:
-            title = movie.get("title")
-            if not title or not isinstance(title, str):
-                continue  # пропускаем, если нет заголовка или он не строка
-        
-            match = re.search(r"\((\d{4})\)", title)
-            if match:
-                year = match.group(1)
-                release_years[year] += 1
+        release_years = self.catalog.release_counts
         return OrderedDict(sorted(release_years.items(), key=lambda x: x[1], reverse=True))
     
     def dist_by_genres(self):
         genres = Counter()
         for movie in self.movies_list:
-            for genre in movie["genres"]:  # уже список
+            for genre in movie.genres:  # уже список
                 genres[genre] += 1
         return dict(genres.most_common())
 
@@ -488,24 +1546,24 @@ class Movies:
             if n < 0:
                 raise Exception("n >= 0")
             movies = {
-                movie["title"]: len(movie["genres"])
+                movie.title: len(movie.genres)
                 for movie in self.movies_list
             }
-            return OrderedDict(sorted(movies.items(), key=lambda x: x[1], reverse=True)[:n])
+            return OrderedDict(top_n(movies.items(), n, key=lambda x: x[1]))
         except Exception as e:
             print(f"error: {e}")
             return {}
 
     def movies_by_genre(self, genre):
-        return [movie["title"] for movie in self.movies_list if genre in movie["genres"]]
+        return [movie.title for movie in self.catalog.genre_index.get(genre, [])]
 
     def movies_by_year(self, year):
  
-        movies = [
-            {"title": movie["title"], "genres": movie["genres"]} 
-            for movie in self.movies_list 
-            if f"({year})" in movie["title"]
-        ]
+        if str(year).isdecimal() and len(str(year)) == 4:
+            matched = self.catalog.year_index.get(int(year), [])
+        else:
+            matched = [movie for movie in self.movies_list if f"({year})" in movie.title]
+        movies = [{"title": movie.title, "genres": movie.genres} for movie in matched]
         
         if not movies:
             return []
@@ -536,105 +1594,320 @@ class Movies:
         try:
             if n < 0:
                 raise Exception('n > 0')
-            combo_counts = Counter(
-            '|'.join(sorted(movie["genres"]))
-            for movie in self.movies_list if movie["genres"]
-            )
+            catalog = self.catalog
+            mask_counts = Counter(mask for mask in catalog.genre_mask if mask)
+            combo_counts = Counter({'|'.join(catalog.genre_names(mask)): count for mask, count in mask_counts.items()})
             return dict(combo_counts.most_common(n))
         except Exception as e:
             print(f"error: {e}")
             return {}
     
-class Ratings:
-    def __init__(self, path_to_the_file, movies_file, movie_ids):
-        self._path = path_to_the_file
-        self._movies_path = movies_file
-        self.ratings = []
-        self.movie_titles = {}
-        self.movies = []
+class RatingsTable:
+    """
+    Columnar storage for ratings.csv.
+    Every column is a typed array (userId, movieId, rating, timestamp),
+    so one rating takes about 20 bytes instead of a dict per row.
+    """
+    HEADER = ['userId', 'movieId', 'rating', 'timestamp']
 
-        # Загружаем рейтинги
-        ratings_data = read_csv_as_dict(self._path, count_lines=1000, valid_movie_ids=movie_ids)
-        for row in ratings_data:
-            try:
-                self.ratings.append({
-                    "userId": int(row.get("userId", 0)),
-                    "movieId": int(row.get("movieId", 0)),
-                    "rating": float(row.get("rating", 0.0)),
-                    "timestamp": int(row.get("timestamp", 0))
-                })
-            except Exception as e:
-                print(f"Ошибка при чтении файла: {e}")
+    def __init__(self):
+        self.user_id = array('i')
+        self.movie_id = array('i')
+        self.rating = array('f')
+        self.timestamp = array('q')
+        self.load_stats = {}
+        self._indexes = {}
 
-        movies_data = self.__load_file(max_lines=1000)
-        for row in movies_data:
-            try:
-                movie_id = int(row.get("movieId", 0))
-            except ValueError:
-                continue
-            if not movie_id:
-                continue
-            row["movieId"] = movie_id
-            row["title"] = row.get("title", "")
-            row["genres"] = row.get("genres", [])
-            self.movie_titles[movie_id] = row["title"]
-            self.movies.append(row)
+    def __len__(self):
+        return len(self.movie_id)
 
-    def __load_file(self, max_lines=1000):
-        movies = []
+    def append(self, user_id, movie_id, rating, timestamp):
+        """Adds one row; if a value does not fit its column, nothing is added and the error is raised."""
         try:
-            with open(self._movies_path, 'r', encoding='utf-8') as file:
-                header = file.readline().strip()
-                if header != "movieId,title,genres":
-                    raise ValueError("Invalid file structure. Expected header: 'movieId,title,genres'")
-                for line_number, line in enumerate(file, start=1):
-                    if max_lines is not None and line_number > max_lines:
-                        break  # достигли лимит строк
+            self.user_id.append(user_id)
+            self.movie_id.append(movie_id)
+            self.rating.append(rating)
+            self.timestamp.append(timestamp)
+        except (OverflowError, TypeError):
+            # timestamp добавляется последним, поэтому его длина - число целых строк
+            for column in self.columns():
+                del column[len(self.timestamp):]
+            raise
+
+    def row(self, i):
+        return Rating(self.user_id[i], self.movie_id[i], self.rating[i], self.timestamp[i])
+
+    def rows(self):
+        return map(Rating, self.user_id, self.movie_id, self.rating, self.timestamp)
+
+    def columns(self):
+        return self.user_id, self.movie_id, self.rating, self.timestamp
+
+    def nbytes(self):
+        return sum(col.itemsize * len(col) for col in self.columns())
+
+    def _grouped(self, name, column):
+        # строки группируются по значению column в порядке первого появления, внутри группы - в порядке файла
+        cached = self._indexes.get(name)
+        if cached is None or cached[0] != len(self):
+            # сортировка подсчётом: размеры групп, их начала, затем номера строк сразу на свои места в array('i'),
+            # без списка номеров строк на группу
+            offsets = {}
+            position = {}
+            start = 0
+            for key, count in Counter(column).items():
+                offsets[key] = (start, start + count)
+                position[key] = start
+                start += count
+            rows = array('i', bytes(array('i').itemsize * len(column)))
+            for i, key in enumerate(column):
+                at = position[key]
+                rows[at] = i
+                position[key] = at + 1
+            ratings = array('f', map(self.rating.__getitem__, rows))
+            cached = self._indexes[name] = (len(self), offsets, rows, ratings)
+        return cached[1:]
+
+    def movie_index(self):
+        """
+        CSR index of the ratings by movie: (offsets, rows, ratings).
+        offsets maps movieId -> (start, end), in order of the movie's first rating; rows[start:end] are
+        the row numbers of the movie's ratings in file order and ratings[start:end] their values.
+        Built on first use, rebuilt after appends.
+        """
+        return self._grouped("movie", self.movie_id)
 
-                    line = line.strip()
-                    if not line:
-                        continue
+    def user_index(self):
+        """The same CSR index by userId."""
+        return self._grouped("user", self.user_id)
 
-                    # Отделяем жанры с конца строки
-                    last_comma = line.rfind(',')
-                    if last_comma == -1:
-                        continue  # строка некорректна
+    def years(self):
+        """
+        Year (UTC) of every rating's timestamp as an array('H') column.
+        Computed once with a binary search over the timestamps of January 1 of each year.
+        """
+        cached = self._indexes.get("year")
+        if cached is None or cached[0] != len(self):
+            column = array('H')
+            if len(self):
+                first = datetime.fromtimestamp(min(self.timestamp), tz=timezone.utc).year
+                last = datetime.fromtimestamp(max(self.timestamp), tz=timezone.utc).year
+                starts = [int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp()) for year in range(first, last + 1)]
+                # bisect_right даёт номер года, начиная с 1; весь цикл идёт в C через map
+                column = array('H', map(operator.add, repeat(first - 1),
+                                        map(bisect_right, repeat(starts), self.timestamp)))
+            cached = self._indexes["year"] = (len(self), column)
+        return cached[1]
+
+    def ratings_of_movie(self, movie_id):
+        offsets, rows, ratings = self.movie_index()
+        start, end = offsets.get(movie_id, (0, 0))
+        return ratings[start:end]
+
+    def ratings_of_user(self, user_id):
+        offsets, rows, ratings = self.user_index()
+        start, end = offsets.get(user_id, (0, 0))
+        return ratings[start:end]
+
+    @classmethod
+    def from_csv(cls, file_path, delimiter=',', encoding='utf-8', count_lines=None, valid_movie_ids=None,
+                 chunk_size=1 << 20, workers=1):
+        """
+        Reads ratings.csv straight into the columns, without building a dict per row.
+        The file is streamed in chunks of about chunk_size characters; count_lines=None or 0 loads every row.
+        Filtering and skipping rules are the same as in read_csv_as_dict.
+        With workers > 1 and no count_lines the file is split into byte ranges that are parsed
+        in a process pool; the columns are the same as with a serial load.
+        Throughput of the load is saved to table.load_stats.
+        """
+        table = cls()
+        started = time.perf_counter()
+        count_lines = count_lines or None  # 0 - без ограничения, как в read_csv_as_dict
+        valid_movie_ids = MovieIdSet.of(valid_movie_ids)
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                headers = [h.strip() for h in f.readline().strip().split(delimiter)]
+                if headers != cls.HEADER:
+                    raise Exception("error header")
+
+                if workers > 1 and count_lines is None:
+                    # процессы возвращают готовые колонки, они склеиваются без объектов на строку
+                    for chunk in map_file_ranges(_ratings_range, file_path, header_end(file_path), workers,
+                                                 delimiter, encoding, valid_movie_ids):
+                        for column, part in zip(table.columns(), chunk):
+                            column.extend(part)
+                else:
+                    lines = chain.from_iterable(read_in_chunks(f, chunk_size))
+                    if valid_movie_ids is not None:
+                        # один отбор строк на весь файл, как в iter_csv: выборка для решения берётся один раз
+                        lines = valid_movie_ids.select(lines, delimiter, 1)
+                    table._extend_from_lines(lines, delimiter, valid_movie_ids, count_lines, selected=True)
+        except FileNotFoundError:
+            print(f"Файл не найден: {file_path}")
+        except Exception as e:
+            print(f"Ошибка при чтении файла: {e}")
+        table.load_stats = load_stats(len(table), started)
+        return table
 
-                    genres_str = line[last_comma + 1:].strip()
-                    left = line[:last_comma]
+    @classmethod
+    def iter_csv(cls, file_path, delimiter=',', encoding='utf-8', count_lines=None, valid_movie_ids=None,
+                 batch_size=1 << 16):
+        """
+        Streams ratings.csv as RatingsTable batches of batch_size rows (the last one may be shorter),
+        so an aggregation over the whole file needs memory for one batch only.
+        The rows are the same as in from_csv with the same arguments.
+        """
+        count_lines = count_lines or None
+        valid_movie_ids = MovieIdSet.of(valid_movie_ids)
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                headers = [h.strip() for h in f.readline().strip().split(delimiter)]
+                if headers != cls.HEADER:
+                    raise Exception("error header")
+
+                # один отбор строк на весь файл: пачки продолжают читать тот же генератор
+                lines = f if valid_movie_ids is None else valid_movie_ids.select(f, delimiter, 1)
+                remaining = count_lines
+                while remaining != 0:
+                    size = batch_size if remaining is None else min(batch_size, remaining)
+                    batch = cls()
+                    left = batch._extend_from_lines(lines, delimiter, valid_movie_ids, size, selected=True)
+                    if remaining is not None:
+                        remaining -= size - left
+                    if len(batch):
+                        yield batch
+                    if left:
+                        break  # файл закончился раньше, чем набралась пачка
+        except FileNotFoundError:
+            print(f"Файл не найден: {file_path}")
+        except Exception as e:
+            print(f"Ошибка при чтении файла: {e}")
 
-                    # Теперь отделим movieId и title
-                    first_comma = left.find(',')
-                    if first_comma == -1:
-                        continue
-                    movie_id_str = left[:first_comma].strip()
+    def _extend_from_lines(self, lines, delimiter=',', valid_movie_ids=None, remaining=None, selected=False):
+        """
+        Parses lines of ratings.csv into the columns.
+        Returns how many rows may still be taken (None if there is no limit);
+        with a limit no line after the last taken one is read from lines.
+        selected=True means lines already come from valid_movie_ids.select().
+        """
+        movie_ids = MovieIdSet.of(valid_movie_ids)
+        if movie_ids is not None and not selected:
+            # фильтрация по movieId до разбора остальных полей
+            lines = movie_ids.select(lines, delimiter, 1)
+        for line in lines:
+            if remaining == 0:
+                break
+            line = line.strip()
+            if not line:
+                continue
 
-                    title = left[first_comma + 1:].strip()
-                    if '"' in title:
-                        if title.split('"')[0] != '' or title.split('"')[-1] != '':
-                            continue
-                    else:
-                        if len(title.split(',')) != 1:
-                            continue
-                    title = title.strip('"')
+            values = [v.strip() for v in line.split(delimiter)]
+            if len(values) != 4:
+                continue
+            if movie_ids is not None and not movie_ids[values[1]]:
+                continue
 
-                    genres = [g.strip() for g in genres_str.split('|')] if genres_str else []
+            if remaining is not None:
+                remaining -= 1
+            try:
+                self.append(int(values[0]), int(values[1]), float(values[2]), int(values[3]))
+            except (ValueError, OverflowError) as e:
+                print(f"Ошибка при чтении файла: {e}")
+            if remaining == 0:
+                break
+        return remaining
 
-                    try:
-                        movies.append({
-                            "movieId": int(movie_id_str),
-                            "title": title,
-                            "genres": genres
-                        })
-                    except ValueError:
-                        continue
 
-        except Exception as e:
-            print(f"Ошибка при чтении файла Movies: {e}")
-        return movies
+def _ratings_range(file_path, start, end, delimiter, encoding, valid_movie_ids):
+    # выполняется в процессе пула: строки диапазона -> колонки RatingsTable
+    table = RatingsTable()
+    table._extend_from_lines(read_lines(file_path, start, end, encoding), delimiter, valid_movie_ids)
+    return table.columns()
+
+
+class Ratings:
+    def __init__(self, path_to_the_file, movies_file, movie_ids, max_lines=None, chunk_size=1 << 20, verbose=False,
+                 workers=1):
+        """
+        max_lines limits how many rows are taken from ratings.csv and movies.csv (None or 0 means everything).
+        workers > 1 parses a full ratings.csv in that many processes.
+        With verbose=True the load throughput is printed.
+        """
+        self._path = path_to_the_file
+        self._movies_path = movies_file
+
+        # Загружаем рейтинги сразу в колонки
+        self.ratings = RatingsTable.from_csv(self._path, count_lines=max_lines, valid_movie_ids=movie_ids,
+                                             chunk_size=chunk_size, workers=workers)
+        self.load_stats = self.ratings.load_stats
+        if verbose:
+            print(f"ratings: {self.load_stats['rows']} rows in {self.load_stats['seconds']} s "
+                  f"({self.load_stats['rows_per_sec']} rows/sec)")
+
+        self._attach_catalog(MovieCatalog.load(self._movies_path, max_lines))
+
+    @classmethod
+    def _from_table(cls, table, catalog, path_to_the_file=None, movies_file=None):
+        ratings = cls.__new__(cls)
+        ratings._path = path_to_the_file
+        ratings._movies_path = movies_file
+        ratings.ratings = table
+        ratings.load_stats = table.load_stats
+        ratings._attach_catalog(catalog)
+        return ratings
+
+    def _attach_catalog(self, catalog):
+        self.catalog = catalog
+        self.movie_titles = {}
+        self.movies = []
+        for row in catalog.movies:
+            movie_id = row.movie_id
+            if not movie_id:
+                continue
+            self.movie_titles[movie_id] = row.title
+            self.movies.append(row)
+
+    def catalog_of(self, movies):
+        """
+        The MovieCatalog whose movies are exactly `movies`, or None.
+        `movies` may be a MovieCatalog, a Movies object or a list of movies: parent.movies,
+        Movies.get_movies() or any other list holding the catalog's own movie records in catalog order.
+        """
+        if isinstance(movies, MovieCatalog):
+            return movies
+        if isinstance(movies, Movies):
+            return movies.catalog
+        catalog = self.catalog
+        for known in (self.movies, catalog.movies):
+            # сравнение по объектам записей, а не по самому списку: get_movies() возвращает копию списка
+            if movies is known or (isinstance(movies, list) and len(movies) == len(known)
+                                   and all(map(operator.is_, movies, known))):
+                return catalog
+        return None
+
+    def __load_file(self, max_lines=None):
+        return list(MovieCatalog.load(self._movies_path, max_lines).movies)
 
     def get_ratings_for_movies(self, movie_ids):
-        return [r["rating"] for r in self.ratings if r["movieId"] in movie_ids]
+        """
+        Ratings of the given movies in file order.
+        Few movies are read as slices of the per-movie index, many movies with one pass over the columns.
+        """
+        table = self.ratings
+        try:
+            ids = set(movie_ids)
+        except TypeError:
+            # нехешируемые элементы (например, словари фильмов) - проверяем вхождение как раньше
+            return [rating for movie_id, rating in zip(table.movie_id, table.rating) if movie_id in movie_ids]
+        offsets, rows, ratings = table.movie_index()
+        spans = [offsets[movie_id] for movie_id in ids if movie_id in offsets]
+        if len(spans) == 1:
+            start, end = spans[0]
+            return ratings[start:end].tolist()
+        if sum(end - start for start, end in spans) > len(table) // 8:
+            return [rating for movie_id, rating in zip(table.movie_id, table.rating) if movie_id in ids]
+        selected = sorted(chain.from_iterable(rows[start:end] for start, end in spans))
+        return [table.rating[i] for i in selected]
 
     @staticmethod
     def extract_year_from_title(title: str) -> int | None:
@@ -649,55 +1922,94 @@ class Ratings:
         return None
 
     class Movies:
+        AGGREGATES = ("dist_by_year", "dist_by_rating", "movie_stats", "movie_histograms")
+
         def __init__(self, parent, movies_list):
             self.parent = parent
             self.ratings = parent.ratings
             self.movie_titles = parent.movie_titles
+            self._catalog = parent.catalog_of(movies_list)
+            if self._catalog is not None and not isinstance(movies_list, list):
+                movies_list = self._catalog.movies
             self.movies = movies_list
+            self._aggregates = {}
+            if self._catalog is not None:
+                self.movie_years = self._catalog.years
+            else:
+                self.movie_years = {}
+                for movie in movies_list:
+                    year = Ratings.extract_year_from_title(movie.get("title", ""))
+                    if year is not None:
+                        self.movie_years[movie.get("movieId")] = year
+
+        def aggregate(self, metrics=AGGREGATES):
+            """
+            Computes all requested aggregates in at most one pass over the ratings and caches them:
+              dist_by_year   - Counter of ratings by year (UTC, from the table's year column),
+              dist_by_rating - Counter of ratings by value,
+              movie_stats      - movieId -> RunningStats (count, sum, mean, variance),
+              movie_histograms - movieId -> RatingHistogram (exact median).
+            The first call computes all of AGGREGATES, so the other metrics need no more passes.
+            """
+            unknown = set(metrics) - set(self.AGGREGATES)
+            if unknown:
+                raise ValueError(f"Unknown aggregates: {sorted(unknown)}")
+            if not self._aggregates:
+                self._aggregates = self.__scan()
+            return {m: self._aggregates[m] for m in metrics}
+
+        def __scan(self):
+            table = self.ratings
+            # распределения по году и по оценке считаются по целым колонкам
+            by_year = Counter(table.years())
+            by_rating = Counter(table.rating)
+            stats = {}
+            histograms = {}
+            for movie_id, rating in zip(table.movie_id, table.rating):
+                st = stats.get(movie_id)
+                if st is None:
+                    st = stats[movie_id] = RunningStats()
+                    hist = histograms[movie_id] = RatingHistogram()
+                else:
+                    hist = histograms[movie_id]
+                st.add(rating)
+                hist.add(rating)
+            return {
+                "dist_by_year": by_year,
+                "dist_by_rating": by_rating,
+                "movie_stats": stats,
+                "movie_histograms": histograms,
+            }
 
         def dist_by_year(self):
-            result = defaultdict(int)
-            for r in self.ratings:
-                try:
-                    timestamp = int(r["timestamp"])
-                    year = datetime.fromtimestamp(timestamp, tz=timezone.utc).year
-                    result[year] += 1
-                except (KeyError, ValueError, TypeError) as e:
-                    print(f"⚠️ Пропущена запись с ошибкой: {r} — {e}")
-                    continue
+            result = self.aggregate(("dist_by_year",))["dist_by_year"]
             return dict(sorted(result.items()))
 
         def dist_by_rating(self):
-            result = defaultdict(int)
-            for r in self.ratings:
-                try:
-                    result[r["rating"]] += 1
-                except (KeyError, ValueError, TypeError) as e:
-                    print(f"⚠️ Пропущена запись с ошибкой: {r} — {e}")
-                    continue
+            result = self.aggregate(("dist_by_rating",))["dist_by_rating"]
             return dict(sorted(result.items()))
 
         def top_by_num_of_ratings(self, n):
-            counts = defaultdict(int)
-            for r in self.ratings:
-                try:
-                    counts[r["movieId"]] += 1
-                except (KeyError, ValueError, TypeError) as e:
-                    print(f"⚠️ Пропущена запись с ошибкой: {r} — {e}")
-                    continue
-            sorted_counts = sorted(counts.items(), key=lambda x: x[1], reverse=True)[:n]
+            stats = self.aggregate(("movie_stats",))["movie_stats"]
+            counts = {mid: st.count for mid, st in stats.items()}
+            sorted_counts = top_n(counts.items(), n, key=lambda x: x[1])
             return {self.movie_titles[mid]: count for mid, count in sorted_counts}
 
         def top_by_ratings(self, n, metric="average"):
-            scores = defaultdict(list)
-            for r in self.ratings:
-                scores[r["movieId"]].append(r["rating"])
             result = {}
-            for mid, values in scores.items():
-                if len(values) < 2:
-                    continue
-                result[mid] = round(mean(values), 2) if metric == "average" else round(median(values), 2)
-            top = sorted(result.items(), key=lambda x: x[1], reverse=True)[:n]
+            if metric == "average":
+                stats = self.aggregate(("movie_stats",))["movie_stats"]
+                for mid, st in stats.items():
+                    if st.count < 2:
+                        continue
+                    result[mid] = round(st.average(), 2)
+            else:
+                histograms = self.aggregate(("movie_histograms",))["movie_histograms"]
+                for mid, hist in histograms.items():
+                    if hist.count < 2:
+                        continue
+                    result[mid] = round(hist.median(), 2)
+            top = top_n(result.items(), n, key=lambda x: x[1])
             return {
                 self.movie_titles[mid]: score
                 for mid, score in top
@@ -705,57 +2017,68 @@ class Ratings:
             }
 
         def top_controversial(self, n):
-            scores = defaultdict(list)
-            for r in self.ratings:
-                scores[r["movieId"]].append(r["rating"])
+            # двухпроходная variance() по оценкам фильма в порядке файла, как в исходной версии,
+            # чтобы округлённые значения совпадали до последнего знака
+            offsets, rows, ratings = self.ratings.movie_index()
             variances = {}
-            for mid, vals in scores.items():
-                if len(vals) < 2:
+            for mid, (start, end) in offsets.items():
+                if end - start < 2:
                     continue
-                variances[mid] = round(variance(vals), 2)
-            top = sorted(variances.items(), key=lambda x: x[1], reverse=True)[:n]
+                variances[mid] = round(variance(ratings[start:end]), 2)
+            top = top_n(variances.items(), n, key=lambda x: x[1])
             return {self.movie_titles[mid]: var
                     for mid, var in top
                     if mid in self.movie_titles}
         
         def average_genre_rating_by_year(self, genre_filter=None, release_year=None):
-            movie_genres = {}
-            movie_years = {}
+            if self._catalog is not None:
+                matching_movies = self.__indexed_movies(genre_filter, release_year)
+            else:
+                matching_movies = self.__scanned_movies(genre_filter, release_year)
+            rating_by_year = defaultdict(RunningStats)
+            table = self.ratings
+            for movie_id, rating_year, rating in zip(table.movie_id, table.years(), table.rating):
+                if movie_id not in matching_movies:
+                    continue
+                rating_by_year[rating_year].add(rating)
+            result = {
+                year: {
+                    "count": stats.count,
+                    "average_rating": round(stats.average(), 2)
+                }
+                for year, stats in sorted(rating_by_year.items())
+            }
+            return result
+
+        def __indexed_movies(self, genre_filter, release_year):
+            # пересечение списков индексов каталога вместо прохода по всем фильмам
+            catalog = self._catalog
+            if release_year is None:
+                if genre_filter is None:
+                    return set(catalog.by_id)
+                return set(catalog.movie_ids_by_genre(genre_filter))
+            # в year_index фильм попадает по любому "(год)" в названии, а год фильма - по последним скобкам
+            movie_years = self.movie_years
+            matching_movies = {movie.movie_id for movie in catalog.year_index.get(release_year, ())
+                               if movie_years.get(movie.movie_id) == release_year}
+            if genre_filter is not None:
+                matching_movies.intersection_update(catalog.movie_ids_by_genre(genre_filter))
+            return matching_movies
+
+        def __scanned_movies(self, genre_filter, release_year):
+            movie_years = self.movie_years
             matching_movies = set()
             for movie in self.movies:
                 movie_id = movie.get("movieId")
-                title = movie.get("title", "")
                 genres = movie.get("genres", "")
-                year = Ratings.extract_year_from_title(title)
-                if year is not None:
-                    movie_years[movie_id] = year
+                year = movie_years.get(movie_id)
                 if isinstance(genres, str):
                     genres = genres.split("|")
-                movie_genres[movie_id] = genres
                 genre_match = genre_filter is None or genre_filter in genres
                 year_match = release_year is None or year == release_year
                 if genre_match and year_match:
                     matching_movies.add(movie_id)
-            rating_by_year = defaultdict(list)
-            for r in self.ratings:
-                movie_id = r["movieId"]
-                if movie_id not in matching_movies:
-                    continue
-                try:
-                    ts = int(r["timestamp"])
-                    rating_year = datetime.fromtimestamp(ts).year
-                    rating = float(r["rating"])
-                except (ValueError, KeyError, TypeError):
-                    continue
-                rating_by_year[rating_year].append(rating)
-            result = {
-                year: {
-                    "count": len(ratings),
-                    "average_rating": round(mean(ratings), 2)
-                }
-                for year, ratings in sorted(rating_by_year.items())
-            }
-            return result
+            return matching_movies
                 
 
     class Users:
@@ -765,6 +2088,12 @@ class Ratings:
             self.movie_genres = {}
             self.movie_years = {}
 
+            self._catalog = parent.catalog_of(movies)
+            if self._catalog is not None:
+                # фильмы из каталога: жанры и годы уже посчитаны там
+                self.movie_genres = self._catalog.genres
+                self.movie_years = self._catalog.years
+                movies = ()
             for m in movies:
                 title = m.get("title", "")
                 movie_id = m.get("movieId")
@@ -777,124 +2106,302 @@ class Ratings:
                 if year is not None:
                     self.movie_years[movie_id] = year
 
+        def _user_slices(self):
+            # оценки каждого пользователя - непрерывный срез индекса, в порядке первого появления пользователя
+            offsets, rows, ratings = self.ratings.user_index()
+            for user_id, (start, end) in offsets.items():
+                yield user_id, ratings[start:end]
+
+        def ratings_of_user(self, user_id):
+            """All ratings of the user as Rating rows in file order, O(k)."""
+            offsets, rows, ratings = self.ratings.user_index()
+            start, end = offsets.get(user_id, (0, 0))
+            return [self.ratings.row(i) for i in rows[start:end]]
+
         def dist_by_num_of_ratings(self):
-            rating_to_users = defaultdict(set)
-            for r in self.ratings:
-                try:
-                    rating = r["rating"]
-                    user_id = r["userId"]
-                    rating_to_users[rating].add(user_id)
-                except (KeyError, ValueError, TypeError) as e:
-                    print(f"{r} — {e}")
-                    continue
-            result = {rating: len(users) for rating, users in rating_to_users.items()}
+            result = defaultdict(int)
+            for user_id, ratings in self._user_slices():
+                for rating in set(ratings):
+                    result[rating] += 1
             return dict(sorted(result.items()))
                     
         def dist_by_user_rating(self, metric="average"):
-            users = defaultdict(list)
-            for r in self.ratings:
-                try:
-                    users[r["userId"]].append(r["rating"])
-                except (KeyError, TypeError):
-                    continue
+            accumulator = RunningStats if metric == "average" else RatingHistogram
             dist = defaultdict(int)
-            for ratings in users.values():
-                if not ratings:
+            for user_id, ratings in self._user_slices():
+                acc = accumulator(ratings)
+                if not acc.count:
                     continue
-                val = round(mean(ratings), 1) if metric == "average" else round(median(ratings), 1)
+                val = round(acc.average(), 1) if metric == "average" else round(acc.median(), 1)
                 dist[val] += 1
             return dict(sorted(dist.items()))
 
         def top_controversial(self, n):
-            users = defaultdict(list)
-            for r in self.ratings:
-                users[r["userId"]].append(r["rating"])
             variances = {}
-            for uid, vals in users.items():
-                if len(vals) < 2:
+            for uid, ratings in self._user_slices():
+                if len(ratings) < 2:
                     continue
-                variances[uid] = round(variance(vals), 2)
-            top = sorted(variances.items(), key=lambda x: x[1], reverse=True)[:n]
+                variances[uid] = round(variance(ratings), 2)
+            top = top_n(variances.items(), n, key=lambda x: x[1])
             return dict(top)
 
         def genre_rating_trend_by_year(self, genre_filter: str = "Drama"):
-            ratings_by_year = defaultdict(list)
+            ratings_by_year = defaultdict(RunningStats)
             users_by_year = defaultdict(set)
-            for r in self.ratings:
-                movie_id = r["movieId"]
-                genres = self.movie_genres.get(movie_id, [])
-                if genre_filter in genres:
-                    rating_year = datetime.fromtimestamp(r["timestamp"]).year
-                    ratings_by_year[rating_year].append(r["rating"])
-                    users_by_year[rating_year].add(r["userId"])
+            if self._catalog is not None:
+                matching_movies = set(self._catalog.movie_ids_by_genre(genre_filter))
+            else:
+                matching_movies = {mid for mid, genres in self.movie_genres.items() if genre_filter in genres}
+            table = self.ratings
+            for user_id, movie_id, rating, rating_year in zip(table.user_id, table.movie_id, table.rating, table.years()):
+                if movie_id in matching_movies:
+                    ratings_by_year[rating_year].add(rating)
+                    users_by_year[rating_year].add(user_id)
             result = {
                 year: {
-                    "Средний рейтинг": round(mean(ratings), 2), 
-                    "оценок": len(ratings),
+                    "Средний рейтинг": round(stats.average(), 2), 
+                    "оценок": stats.count,
                     "пользователей": len(users_by_year[year]) 
                 }
-                for year, ratings in sorted(ratings_by_year.items())
+                for year, stats in sorted(ratings_by_year.items())
             }
             return result
 
 
+class TagVocabulary:
+    """
+    Interned tags: every distinct tag gets an int id (in order of first appearance)
+    and precomputed columns frequency, words (number of words) and length.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.tags = []
+        self.frequency = array('i')
+        self.words = array('i')
+        self.length = array('i')
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __getitem__(self, tag_id):
+        return self.tags[tag_id]
+
+    def add(self, tag):
+        """Counts one more occurrence of tag and returns its id."""
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            tag_id = self.ids[tag] = len(self.tags)
+            self.tags.append(tag)
+            self.frequency.append(0)
+            self.words.append(len(tag.split()))
+            self.length.append(len(tag))
+        self.frequency[tag_id] += 1
+        return tag_id
+
+    def decode(self, tag_ids):
+        return [self.tags[tag_id] for tag_id in tag_ids]
+
+    def merge(self, tags, frequency):
+        """Adds the tags of another vocabulary with their frequencies; returns array remap: old id -> new id."""
+        remap = array('i')
+        for tag, count in zip(tags, frequency):
+            tag_id = self.add(tag)
+            self.frequency[tag_id] += count - 1
+            remap.append(tag_id)
+        return remap
+
+
+class TagIndex:
+    """
+    Search index over tags: lower-cased tokens and the trigrams of every tag.
+    containing(text) answers "text in tag.lower()" by checking only the tags in the shortest
+    trigram posting of text instead of every tag. With movie_tags ({movieId: [tag ids]},
+    ids are positions in tags) it also maps tags to their movies (built on the first movies_with call).
+    """
+    N = 3
+
+    def __init__(self, tags, movie_tags=None):
+        self.tags = list(dict.fromkeys(tags))
+        self.lower = [tag.lower() for tag in self.tags]
+        self.grams = defaultdict(list)
+        self.tokens = defaultdict(set)
+        for i, text in enumerate(self.lower):
+            for gram in {text[start:start + self.N] for start in range(len(text) - self.N + 1)}:
+                self.grams[gram].append(i)
+            for token in text.split():
+                self.tokens[token].add(i)
+        self.grams = dict(self.grams)
+        self.tokens = dict(self.tokens)
+        self._short = {}  # запросы короче триграммы: результат полного просмотра запоминается
+        self._movie_tags = movie_tags or {}
+        self._movies = None
+
+    def containing(self, text):
+        """Ids of the tags that contain text, case-insensitive."""
+        text = text.lower()
+        if len(text) < self.N:
+            if text not in self._short:
+                self._short[text] = {i for i, tag in enumerate(self.lower) if text in tag}
+            return self._short[text]
+        postings = [self.grams.get(text[start:start + self.N], ()) for start in range(len(text) - self.N + 1)]
+        lower = self.lower
+        return {i for i in min(postings, key=len) if text in lower[i]}
+
+    def with_token(self, token):
+        """Ids of the tags that have token as a whole word, case-insensitive."""
+        return self.tokens.get(token.lower(), set())
+
+    def tags_containing(self, text):
+        return sorted(self.tags[i] for i in self.containing(text))
+
+    def movies_with(self, text):
+        """movieIds that have a tag containing text, in the order of movie_tags."""
+        if self._movies is None:
+            # тег -> фильмы с ним, и порядок фильмов в movie_tags
+            self._movies = (defaultdict(list), {})
+            for movie_id, tag_ids in self._movie_tags.items():
+                self._movies[1][movie_id] = len(self._movies[1])
+                for tag_id in set(tag_ids):
+                    self._movies[0][tag_id].append(movie_id)
+        tag_movies, movie_order = self._movies
+        movies = set()
+        for i in self.containing(text):
+            movies.update(tag_movies.get(i, ()))
+        return sorted(movies, key=movie_order.__getitem__)
+
+
 class Tags:
-    def __init__(self, path_to_the_file, movie_ids):
-        self.tags = set()
-        self.tag_list = []
-        self.movie_tags = {}
+    def __init__(self, path_to_the_file, movie_ids, max_lines=None, verbose=False, workers=1):
+        """workers > 1 parses a full tags.csv in that many processes, with the same result."""
+        # каждый тег хранится один раз в словаре, остальное - его id
+        self.vocabulary = TagVocabulary()
+        self._tag_codes = array('i')
+        self._movie_tag_codes = {}
         self.valid_movie_ids = set(movie_ids)
 
-        rows = read_csv_as_dict(path_to_the_file, count_lines=1000, valid_movie_ids=movie_ids)
+        started = time.perf_counter()
+        if workers > 1 and not max_lines:
+            self._extend_parallel(path_to_the_file, movie_ids, workers)
+        else:
+            self._extend(iter_csv_as_dict(path_to_the_file, count_lines=max_lines, valid_movie_ids=movie_ids))
+
+        self.tags = set(self.vocabulary.tags)
+        self._index = None
+        self.load_stats = load_stats(len(self._tag_codes), started)
+        if verbose:
+            print(f"tags: {self.load_stats['rows']} rows in {self.load_stats['seconds']} s "
+                  f"({self.load_stats['rows_per_sec']} rows/sec)")
+
+    def _extend(self, rows):
         for row in rows:
             try:
                 tag = row.get("tag", "").strip()
                 movie_id = int(row.get("movieId", 0))
 
                 if tag:
-                    self.tags.add(tag)
-                    self.tag_list.append(tag)
-                    self.movie_tags.setdefault(movie_id, []).append(tag)
+                    tag_id = self.vocabulary.add(tag)
+                    self._tag_codes.append(tag_id)
+                    tag_ids = self._movie_tag_codes.get(movie_id)
+                    if tag_ids is None:
+                        tag_ids = self._movie_tag_codes[movie_id] = array('i')
+                    tag_ids.append(tag_id)
             except Exception as e:
                 print(f"Ошибка при обработке строки: {row}, ошибка: {e}")
 
+    def _extend_parallel(self, path_to_the_file, movie_ids, workers):
+        # диапазоны файла разбираются в процессах в свои словари тегов, затем id переводятся в общий словарь
+        try:
+            with open(path_to_the_file, 'r', encoding='utf-8') as f:
+                headers = read_csv_header(f)
+            for tags, frequency, tag_list, movie_tags in map_file_ranges(
+                    _tags_range, path_to_the_file, header_end(path_to_the_file), workers, headers,
+                    MovieIdSet.of(movie_ids)):
+                remap = self.vocabulary.merge(tags, frequency)
+                self._tag_codes.extend(map(remap.__getitem__, tag_list))
+                for movie_id, ids in movie_tags.items():
+                    tag_ids = self._movie_tag_codes.get(movie_id)
+                    if tag_ids is None:
+                        tag_ids = self._movie_tag_codes[movie_id] = array('i')
+                    tag_ids.extend(map(remap.__getitem__, ids))
+        except FileNotFoundError:
+            print(f"Файл не найден: {path_to_the_file}")
+        except Exception as e:
+            print(f"Ошибка при чтении файла: {e}")
+
+    @classmethod
+    def _from_parts(cls, vocabulary, tag_list, movie_tags, valid_movie_ids, stats=None):
+        tags = cls.__new__(cls)
+        tags.vocabulary = vocabulary
+        tags._tag_codes = tag_list
+        tags._movie_tag_codes = movie_tags
+        tags.valid_movie_ids = set(valid_movie_ids)
+        tags.tags = set(vocabulary.tags)
+        tags._index = None
+        tags.load_stats = stats or {}
+        return tags
+
+    @property
+    def tag_list(self):
+        """Every tag row as a string, in file order (decoded from the int codes on each access)."""
+        return self.vocabulary.decode(self._tag_codes)
+
+    @property
+    def movie_tags(self):
+        """{movieId: [tags]}, decoded from the int codes on each access."""
+        return self.get_all_tags()
+
     def most_words(self, n):
-        return dict(
-            sorted(
-                {tag: len(tag.split()) for tag in self.tags}.items(),
-                key=lambda x: (-x[1], x[0]),  # Сортировка по убыванию слов, затем по алфавиту
-            )[:n]
-        )
+        vocabulary = self.vocabulary
+        top = top_n(range(len(vocabulary)), n,
+                    key=lambda i: (-vocabulary.words[i], vocabulary.tags[i]),  # по убыванию слов, затем по алфавиту
+                    reverse=False)
+        return {vocabulary.tags[i]: vocabulary.words[i] for i in top}
 
     def longest(self, n):
-        return sorted(self.tags, key=lambda x: (-len(x), x))[:n]
+        vocabulary = self.vocabulary
+        top = top_n(range(len(vocabulary)), n, key=lambda i: (-vocabulary.length[i], vocabulary.tags[i]),
+                    reverse=False)
+        return vocabulary.decode(top)
 
     def most_words_and_longest(self, n):
+        vocabulary = self.vocabulary
         top_words = set(self.most_words(n).keys())
         top_longest = set(self.longest(n))
-        intersected = top_words & top_longest
-        return sorted(intersected, key=lambda tag: (-len(tag.split()), -len(tag), tag))
+        intersected = [vocabulary.ids[tag] for tag in top_words & top_longest]
+        return vocabulary.decode(sorted(
+            intersected, key=lambda i: (-vocabulary.words[i], -vocabulary.length[i], vocabulary.tags[i])))
 
     def most_popular(self, n):
-        return dict(Counter(self.tag_list).most_common(n))
+        vocabulary = self.vocabulary
+        if n is not None and n < 0:
+            return {}
+        top = top_n(range(len(vocabulary)), n, key=vocabulary.frequency.__getitem__)
+        return {vocabulary.tags[i]: vocabulary.frequency[i] for i in top}
+
+    @property
+    def index(self):
+        # строится при первом поиске и заново, если теги добавились
+        if self._index is None or self._index[0] != len(self._tag_codes):
+            self._index = (len(self._tag_codes), TagIndex(self.vocabulary.tags, self._movie_tag_codes))
+        return self._index[1]
 
     def tags_with(self, word):
-        word = word.lower()
-        return sorted({tag for tag in self.tags if word in tag.lower()})
+        return self.index.tags_containing(word)
+
+    def tags_with_word(self, word):
+        """Tags that contain word as a whole word (case-insensitive)."""
+        index = self.index
+        return sorted(index.tags[i] for i in index.with_token(word))
 
     def get_all_tags(self):
-        return self.movie_tags
+        return {movie_id: self.vocabulary.decode(tag_ids) for movie_id, tag_ids in self._movie_tag_codes.items()}
 
     def top_movies_by_tag(self, tag_name, ratings_obj, movies_obj, n=10):
-        tag_name = tag_name.lower()
-
         movies = movies_obj.get_movies()
         movie_title_map = {int(m['movieId']): m['title'] for m in movies}
 
-        movie_ids = [
-            mid for mid, tags in self.movie_tags.items()
-            if mid in self.valid_movie_ids and any(tag_name in t.lower() for t in tags)
-        ]
+        movie_ids = [mid for mid in self.index.movies_with(tag_name) if mid in self.valid_movie_ids]
         avg_ratings = {}
         for mid in movie_ids:
             ratings = ratings_obj.get_ratings_for_movies([mid])
@@ -903,7 +2410,7 @@ class Tags:
                 title = movie_title_map.get(mid, f"[ID {mid}]")
                 avg_ratings[title] = round(avg, 2)
 
-        sorted_avg = dict(sorted(avg_ratings.items(), key=lambda x: x[1], reverse=True)[:n])
+        sorted_avg = dict(top_n(avg_ratings.items(), n, key=lambda x: x[1]))
         return sorted_avg
 
     def tag_statistics(self, movies_obj):
@@ -914,7 +2421,7 @@ class Tags:
         movie_title_map = {int(m['movieId']): m['title'] for m in movies}
         
         stats = {}
-        for mid, tags in self.movie_tags.items():
+        for mid, tags in self._movie_tag_codes.items():
 
             movie_id = int(mid)
             if movie_id in valid_movie_ids:
@@ -930,10 +2437,265 @@ class Tags:
         if movie_id is None:
             print(f"Фильм '{title}' не найден.")
             return []
-        return self.movie_tags.get(movie_id, [])
+        return self.vocabulary.decode(self._movie_tag_codes.get(movie_id, ()))
+
+    def get_tags_for_movies(self, titles, movies_obj, fuzzy=False):
+        """Returns {title: tags} for a batch of titles; titles that are not found get []."""
+        result = {}
+        for title, movie_id in movies_obj.get_movie_ids_by_titles(titles, fuzzy).items():
+            if movie_id is None:
+                print(f"Фильм '{title}' не найден.")
+                result[title] = []
+            else:
+                result[title] = self.vocabulary.decode(self._movie_tag_codes.get(movie_id, ()))
+        return result
     
 
 
+def _tags_range(file_path, start, end, headers, valid_movie_ids):
+    # выполняется в процессе пула: строки диапазона -> словарь тегов и id, как в Tags
+    part = Tags._from_parts(TagVocabulary(), array('i'), {}, ())
+    part._extend(csv_rows(read_lines(file_path, start, end), headers, valid_movie_ids=valid_movie_ids))
+    return part.vocabulary.tags, part.vocabulary.frequency, part._tag_codes, part._movie_tag_codes
+
+
+class Snapshot:
+    """
+    Versioned binary snapshot of a loaded dataset (Movies, Ratings, Tags, Links).
+    The snapshot is a directory: manifest.json, one file per fixed-width column with the raw bytes
+    of the array, and string tables (UTF-8 text plus an offsets column).
+    load() maps the column files with mmap: nothing is parsed, and processes that open the same
+    snapshot share its pages. Rating columns of a loaded snapshot are read-only memoryviews;
+    close() (or a with block) releases them, the loaded objects must not be used after that.
+    save() replaces every file instead of rewriting it, so a snapshot that is still mapped stays readable.
+    """
+    FORMAT = "movielens-snapshot"
+    VERSION = 1
+
+    def __init__(self, path, manifest=None):
+        self.path = path
+        self.manifest = manifest or {"format": self.FORMAT, "version": self.VERSION,
+                                     "byteorder": sys.byteorder, "columns": {}, "sources": {}}
+        self.movies = None
+        self.ratings = None
+        self.tags = None
+        self.links = None
+        self._maps = []
+        self._views = []
+        self._catalogs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Releases the column memoryviews and unmaps the column files."""
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # срез колонки ещё где-то жив: отображение закроется, когда его соберёт GC
+                pass
+        self._views.clear()
+        self._maps.clear()
+
+    @classmethod
+    def save(cls, path, movies=None, ratings=None, tags=None, links=None):
+        """Writes the given objects to the directory path and returns the Snapshot."""
+        os.makedirs(path, exist_ok=True)
+        snapshot = cls(path)
+        manifest = snapshot.manifest
+        if movies is not None:
+            manifest["movies"] = {"path": movies._path, "catalog": snapshot._put_catalog(movies.catalog)}
+        if ratings is not None:
+            snapshot._put_ratings(ratings)
+        if tags is not None:
+            snapshot._put_tags(tags)
+        if links is not None:
+            manifest["links"] = {"path": links._path_to_the_file}
+            snapshot._put_strings("links.imdb_id", links.dict_file)
+        for section in ("movies", "ratings", "tags", "links"):
+            for key in ("path", "movies_path"):
+                source = manifest.get(section, {}).get(key)
+                if source and os.path.exists(source):
+                    st = os.stat(source)
+                    manifest["sources"][source] = [st.st_size, st.st_mtime_ns]
+        # manifest пишется последним: снимок без него не откроется
+        tmp = os.path.join(path, "manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(path, "manifest.json"))
+        snapshot.movies, snapshot.ratings, snapshot.tags, snapshot.links = movies, ratings, tags, links
+        return snapshot
+
+    @classmethod
+    def load(cls, path):
+        """Opens a snapshot written by save(); raises ValueError for another format or version."""
+        started = time.perf_counter()
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != cls.FORMAT or manifest.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported snapshot {manifest.get('format')} v{manifest.get('version')}, "
+                             f"expected {cls.FORMAT} v{cls.VERSION}")
+        if manifest["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot was written on a {manifest['byteorder']}-endian machine")
+        snapshot = cls(path, manifest)
+        if "movies" in manifest:
+            snapshot.movies = Movies._from_catalog(snapshot._get_catalog(manifest["movies"]["catalog"]),
+                                                   manifest["movies"]["path"])
+        if "ratings" in manifest:
+            snapshot.ratings = snapshot._get_ratings(started)
+        if "tags" in manifest:
+            snapshot.tags = snapshot._get_tags(started)
+        if "links" in manifest:
+            snapshot.links = Links._from_column(snapshot._get_strings("links.imdb_id"), manifest["links"]["path"])
+        return snapshot
+
+    def is_stale(self):
+        """True if a source CSV changed (size or mtime) since the snapshot was written."""
+        for source, (size, mtime) in self.manifest["sources"].items():
+            try:
+                st = os.stat(source)
+            except OSError:
+                return True
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                return True
+        return False
+
+    # --- колонки и строки
+
+    def _put_column(self, name, column):
+        typecode = column.typecode if isinstance(column, array) else column.format
+        # новый файл подменяет старый целиком: усечение файла, отображённого другим снимком, обрушит его (SIGBUS)
+        path = os.path.join(self.path, name + ".bin")
+        with open(path + ".tmp", "wb") as f:
+            f.write(column)
+        os.replace(path + ".tmp", path)
+        self.manifest["columns"][name] = {"typecode": typecode, "itemsize": column.itemsize, "length": len(column)}
+
+    def _get_column(self, name):
+        meta = self.manifest["columns"][name]
+        if array(meta["typecode"]).itemsize != meta["itemsize"]:
+            raise ValueError(f"Column {name}: item size {meta['itemsize']} does not match this platform")
+        if meta["length"] == 0:
+            return array(meta["typecode"])
+        with open(os.path.join(self.path, name + ".bin"), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        with memoryview(mapped) as raw:
+            view = raw.cast(meta["typecode"])
+        self._views.append(view)
+        return view
+
+    def _put_strings(self, name, strings):
+        # смещения в символах: при чтении текст декодируется один раз и режется срезами
+        offsets = array('q', [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        self._put_column(name + ".offsets", offsets)
+        self._put_column(name + ".text", array('B', ''.join(strings).encode('utf-8')))
+
+    def _get_strings(self, name):
+        offsets = self._get_column(name + ".offsets")
+        text = str(self._get_column(name + ".text"), 'utf-8')
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def _put_groups(self, name, groups, values):
+        # {key: (start, end)} с подряд идущими группами -> колонки ключей и границ
+        self._put_column(name + ".keys", array('i', groups))
+        self._put_column(name + ".bounds", array('q', [0] + [end for start, end in groups.values()]))
+        for suffix, column in values.items():
+            self._put_column(f"{name}.{suffix}", column)
+
+    def _get_groups(self, name):
+        bounds = self._get_column(name + ".bounds")
+        return dict(zip(self._get_column(name + ".keys"), zip(bounds, bounds[1:])))
+
+    # --- разделы
+
+    def _put_catalog(self, catalog):
+        for i, saved in enumerate(self._catalogs):
+            if saved is catalog:
+                return i
+        i = len(self._catalogs)
+        self._catalogs.append(catalog)
+        combos = {}
+        refs = array('i', (combos.setdefault(tuple(m.genres), len(combos)) for m in catalog.movies))
+        self._put_column(f"catalog{i}.movie_id", array('i', (m.movie_id for m in catalog.movies)))
+        self._put_strings(f"catalog{i}.title", [m.title for m in catalog.movies])
+        self._put_strings(f"catalog{i}.genres", ['|'.join(genres) for genres in combos])
+        self._put_column(f"catalog{i}.genres_ref", refs)
+        return i
+
+    def _get_catalog(self, i):
+        while len(self._catalogs) <= i:
+            self._catalogs.append(None)
+        if self._catalogs[i] is None:
+            # строка комбинации жанров разбирается один раз, каждый фильм получает свою копию, как в MovieCatalog.parse
+            combos = [combo.split('|') if combo else [] for combo in self._get_strings(f"catalog{i}.genres")]
+            movies = [Movie(movie_id, title, combos[ref][:])
+                      for movie_id, title, ref in zip(self._get_column(f"catalog{i}.movie_id"),
+                                                       self._get_strings(f"catalog{i}.title"),
+                                                       self._get_column(f"catalog{i}.genres_ref"))]
+            self._catalogs[i] = MovieCatalog(movies)
+        return self._catalogs[i]
+
+    def _put_ratings(self, ratings):
+        table = ratings.ratings
+        self.manifest["ratings"] = {"path": ratings._path, "movies_path": ratings._movies_path,
+                                    "catalog": self._put_catalog(ratings.catalog)}
+        for name in ("user_id", "movie_id", "rating", "timestamp"):
+            self._put_column(f"ratings.{name}", getattr(table, name))
+        # производные колонки тоже сохраняются, чтобы после загрузки их не пересчитывать
+        self._put_column("ratings.year", table.years())
+        for name, (offsets, rows, values) in (("movie", table.movie_index()), ("user", table.user_index())):
+            self._put_groups(f"ratings.{name}_index", offsets, {"rows": rows, "ratings": values})
+
+    def _get_ratings(self, started):
+        meta = self.manifest["ratings"]
+        table = RatingsTable()
+        for name in ("user_id", "movie_id", "rating", "timestamp"):
+            setattr(table, name, self._get_column(f"ratings.{name}"))
+        table._indexes["year"] = (len(table), self._get_column("ratings.year"))
+        for name in ("movie", "user"):
+            prefix = f"ratings.{name}_index"
+            table._indexes[name] = (len(table), self._get_groups(prefix),
+                                    self._get_column(prefix + ".rows"), self._get_column(prefix + ".ratings"))
+        table.load_stats = load_stats(len(table), started)
+        return Ratings._from_table(table, self._get_catalog(meta["catalog"]), meta["path"], meta["movies_path"])
+
+    def _put_tags(self, tags):
+        vocabulary = tags.vocabulary
+        self.manifest["tags"] = {}
+        self._put_strings("tags.vocabulary", vocabulary.tags)
+        for name in ("frequency", "words", "length"):
+            self._put_column(f"tags.{name}", getattr(vocabulary, name))
+        self._put_column("tags.tag_list", tags._tag_codes)
+        groups, ids = {}, array('i')
+        for movie_id, tag_ids in tags._movie_tag_codes.items():
+            groups[movie_id] = (len(ids), len(ids) + len(tag_ids))
+            ids.extend(tag_ids)
+        self._put_groups("tags.movie_tags", groups, {"ids": ids})
+        self._put_column("tags.valid_movie_ids", array('i', tags.valid_movie_ids))
+
+    def _get_tags(self, started):
+        vocabulary = TagVocabulary()
+        vocabulary.tags = self._get_strings("tags.vocabulary")
+        vocabulary.ids = {tag: i for i, tag in enumerate(vocabulary.tags)}
+        for name in ("frequency", "words", "length"):
+            setattr(vocabulary, name, array('i', self._get_column(f"tags.{name}")))
+        ids = self._get_column("tags.movie_tags.ids")
+        movie_tags = {movie_id: array('i', ids[start:end])
+                      for movie_id, (start, end) in self._get_groups("tags.movie_tags").items()}
+        tag_list = self._get_column("tags.tag_list")
+        return Tags._from_parts(vocabulary, tag_list, movie_tags, self._get_column("tags.valid_movie_ids"),
+                                load_stats(len(tag_list), started))
+
+
 class Tests:
 
     TEST_MOVIES_FILE = "test_movies.csv"
@@ -944,6 +2706,21 @@ class Tests:
     RATINGS_FILE = "../datasets/ml-latest-small/ratings.csv"
     LINKS_FILE = "../datasets/ml-latest-small/links.csv"
     TAGS_FILE = "../datasets/ml-latest-small/tags.csv"
+    # ответы в тестах посчитаны по первым 1000 строкам каждого файла
+    MAX_LINES = 1000
+
+    @pytest.fixture
+    def small_dataset(self, tmp_path):
+        """Маленькие movies.csv, ratings.csv, tags.csv и links.csv в tmp_path; возвращает tmp_path"""
+        (tmp_path / "movies.csv").write_text('movieId,title,genres\n1,Toy Story (1995),Adventure|Comedy\n'
+                                             '2,"Heat, The (1995)",Action\n3,Amélie (2001),Comedy|Romance\n'
+                                             '4,Untitled,\n', encoding='utf-8')
+        (tmp_path / "ratings.csv").write_text("userId,movieId,rating,timestamp\n2,1,4.0,964982703\n"
+                                              "1,2,3.0,1445714835\n2,3,5.0,964982931\n1,1,2.5,1704067200\n")
+        (tmp_path / "tags.csv").write_text("userId,movieId,tag,timestamp\n"
+                                           "1,1,pixar,1\n2,1,funny,2\n2,3,Paris,3\n1,3,funny,4\n")
+        (tmp_path / "links.csv").write_text("movieId,imdbId,tmdbId\n1,0114709,862\n2,0113277,949\n")
+        return tmp_path
 
 
     class TestHelpers:
@@ -977,11 +2754,384 @@ class Tests:
             assert variance([1, 2, 3, 4, 5]) == pytest.approx(2.5)
             assert variance([]) == 0
 
+        def test_top_n(self):
+            items = list({'a': 3, 'b': 5, 'c': 3, 'd': 1, 'e': 5, 'f': 3}.items())
+            for n in (0, 1, 3, 4, 10, -2):
+                assert top_n(items, n, key=lambda x: x[1]) == sorted(items, key=lambda x: x[1], reverse=True)[:n]
+                assert top_n(items, n, key=lambda x: (-x[1], x[0]), reverse=False) == sorted(items, key=lambda x: (-x[1], x[0]))[:n]
+            assert top_n(iter(items), 2, key=lambda x: x[1]) == [('b', 5), ('e', 5)]
+
+        def test_running_stats(self):
+            values = [4.0, 0.5, 3.5, 5.0, 3.0, 3.0, 2.5]
+            stats = RunningStats(values)
+            assert stats.count == len(values)
+            assert stats.average() == mean(values)
+            assert stats.variance() == pytest.approx(variance(values))
+            merged = RunningStats(values[:3]).merge(RunningStats(values[3:]))
+            assert merged.count == stats.count
+            assert merged.average() == stats.average()
+            assert merged.variance() == pytest.approx(stats.variance())
+            assert RunningStats().average() == 0
+            assert RunningStats([1.0]).variance() == 0
+
+        def test_rating_histogram(self):
+            values = [4.0, 0.5, 3.5, 5.0, 3.0, 3.0, 2.5]
+            assert RatingHistogram(values).median() == median(values)
+            assert RatingHistogram(values[:6]).median() == median(values[:6])
+            merged = RatingHistogram(values[:2]).merge(RatingHistogram(values[2:]))
+            assert merged.count == len(values)
+            assert merged.median() == median(values)
+            assert RatingHistogram().median() == 0
+
+        def test_ratings_table(self, tmp_path):
+            table = RatingsTable()
+            table.append(1, 10, 4.5, 964982703)
+            table.append(2, 20, 0.5, 1445714835)
+            assert len(table) == 2
+            assert table.nbytes() == 40
+            assert table.row(1) == {"userId": 2, "movieId": 20, "rating": 0.5, "timestamp": 1445714835}
+            assert list(table.rows()) == [table.row(0), table.row(1)]
+            with pytest.raises(OverflowError):
+                table.append(3, 3000000000, 4.0, 1)
+            assert [len(column) for column in table.columns()] == [2, 2, 2, 2]
+            assert table.row(1) == Rating(2, 20, 0.5, 1445714835)
+            path = tmp_path / "ratings.csv"
+            path.write_text("userId,movieId,rating,timestamp\n1,7,4.0,1\n1,3000000000,4.0,2\n2,8,3.0,3\n")
+            assert list(RatingsTable.from_csv(str(path)).rows()) == [Rating(1, 7, 4.0, 1), Rating(2, 8, 3.0, 3)]
+
+        def test_ratings_table_years(self):
+            table = RatingsTable()
+            timestamps = [0, -1, 946684799, 946684800, 1445714835, 1704067199, 1704067200, 964982703]
+            for ts in timestamps:
+                table.append(1, 1, 4.0, ts)
+            assert list(table.years()) == [datetime.fromtimestamp(ts, tz=timezone.utc).year for ts in timestamps]
+            assert list(table.years()) == [1970, 1969, 1999, 2000, 2015, 2023, 2024, 2000]
+            table.append(1, 1, 4.0, 2000000000)
+            assert table.years()[-1] == 2033
+            assert len(RatingsTable().years()) == 0
+
+        def test_iter_csv(self, tmp_path):
+            path = tmp_path / "ratings.csv"
+            path.write_text("userId,movieId,rating,timestamp\n" +
+                            "".join(f"{u},{u % 4},{u % 5 + 0.5},{u}\n" for u in range(1, 24)) + "\n1,2\nx,1,1.0,1\n")
+            rows = iter_csv_as_dict(str(path), valid_movie_ids={1, 2})
+            assert next(rows) == {"userId": "1", "movieId": "1", "rating": "1.5", "timestamp": "1"}
+            assert [next(rows)] + list(rows) == read_csv_as_dict(str(path), valid_movie_ids={1, 2})[1:]
+            batches = list(iter_csv_as_dict(str(path), batch_size=5))
+            assert [len(batch) for batch in batches] == [5, 5, 5, 5, 4]
+            assert list(chain.from_iterable(batches)) == read_csv_as_dict(str(path))
+            assert list(iter_csv_as_dict(str(path), count_lines=7, batch_size=3))[-1] == read_csv_as_dict(str(path))[6:7]
+            assert list(iter_csv_as_dict(str(tmp_path / "missing.csv"))) == []
+            for count_lines, valid in ((None, None), (None, {0, 3}), (10, None), (12, {1, 2})):
+                table = RatingsTable.from_csv(str(path), count_lines=count_lines, valid_movie_ids=valid)
+                batches = list(RatingsTable.iter_csv(str(path), count_lines=count_lines, valid_movie_ids=valid,
+                                                     batch_size=4))
+                assert all(len(batch) == 4 for batch in batches[:-1])
+                assert list(chain.from_iterable(batch.rows() for batch in batches)) == list(table.rows())
+
+        def test_max_lines_zero(self, small_dataset):
+            # 0, как и None, - без ограничения, во всех загрузчиках
+            ratings_path, movies_path = str(small_dataset / "ratings.csv"), str(small_dataset / "movies.csv")
+            ratings = Ratings(ratings_path, movies_path, None, max_lines=0)
+            assert len(ratings.ratings) == 4 and len(ratings.movies) == 4
+            assert len(Movies(movies_path, max_lines=0).get_movies()) == 4
+            assert len(Tags(str(small_dataset / "tags.csv"), [1, 2, 3], max_lines=0).tag_list) == 4
+            assert sum(map(len, RatingsTable.iter_csv(ratings_path, count_lines=0))) == 4
+            assert len(read_csv_as_dict(ratings_path, count_lines=0)) == 4
+
+        def test_records(self, tmp_path):
+            movie = Movie(1, "Toy Story (1995)", ["Animation"])
+            assert movie.title == movie["title"] == movie.get("title") == "Toy Story (1995)"
+            assert movie == {"movieId": 1, "title": "Toy Story (1995)", "genres": ["Animation"]} == dict(movie)
+            assert movie != Movie(2, "Toy Story (1995)", ["Animation"]) and movie != Link(1, "Toy Story (1995)", ["Animation"])
+            assert "genres" in movie and "rating" not in movie and movie.get("rating", 0) == 0
+            assert not hasattr(movie, "__dict__")
+            with pytest.raises(TypeError):
+                movie["title"] = "Toy Story"
+            with pytest.raises(AttributeError):
+                movie.title = "Toy Story"
+            with pytest.raises(AttributeError):
+                del movie.movie_id
+            assert movie.title == "Toy Story (1995)"
+            assert pickle.loads(pickle.dumps(movie)) == copy.deepcopy(movie) == movie
+            with pytest.raises(KeyError):
+                movie["year"]
+
+            path = tmp_path / "tags.csv"
+            path.write_text("userId,movieId,tag,timestamp\n1,2, funny ,3\nx,2,bad,1\n1,3,dark,4\n")
+            assert list(iter_csv_records(str(path))) == [Tag(1, 2, "funny", 3), Tag(1, 3, "dark", 4)]
+            assert list(iter_csv_records(str(path), valid_movie_ids={3})) == [Tag(1, 3, "dark", 4)]
+            path.write_text("userId,movieId,rating,timestamp\n1,2,4.5,3\n")
+            assert list(iter_csv_records(str(path))) == [Rating(1, 2, 4.5, 3)]
+            assert RatingsTable.from_csv(str(path)).row(0) == Rating(1, 2, 4.5, 3)
+            path = tmp_path / "links.csv"
+            path.write_text("movieId,imdbId,tmdbId\n1,0114709,862\n2,0113277,\nx,1,1\n")
+            assert Links.read_csv_records(str(path)) == [Link(1, "0114709", 862), Link(2, "0113277", None)]
+            assert Links.read_csv_records(str(path), {2}) == [{"movieId": 2, "imdbId": "0113277", "tmdbId": None}]
+
+        def test_movie_id_set(self, tmp_path, monkeypatch):
+            valid = {1, 7, Decimal(30), 2.0, Fraction(12, 3), Fraction(1, 2), float("nan"), "5"}
+            movie_ids = MovieIdSet(valid)
+            for field in ("1", "7", "2", "4", "5", "0", "-7", "007", " 7", "7 ", "+7", "٧", "7.0", "", "x", "1_0", "30"):
+                try:
+                    expected = int(field) in valid
+                except ValueError:
+                    expected = False
+                assert movie_ids[field] is expected, field
+            assert movie_ids[None] is False
+            assert MovieIdSet.of(movie_ids) is movie_ids and MovieIdSet.of(None) is None
+            assert movie_ids.ids == {1, 2, 4, 7, 30}
+            assert MovieIdSet({-1})["-1"] and MovieIdSet({10 ** 9})["0001000000000"]
+
+            lines = [f"{i},{i % 10},x" for i in range(40)] + ["1", "2,1"]
+            selective = MovieIdSet({1, 7})
+            assert list(selective.select(iter(lines), sample=10)) == [line for line in lines if line.split(",")[1:2] in (["1"], ["7"])]
+            passthrough = MovieIdSet(range(1, 10))
+            assert list(passthrough.select(lines, sample=10)) == [line for line in lines[:10] if not line.endswith(",0,x")] + lines[10:]
+            # решение о пропуске строк не переносится на следующий файл
+            assert list(passthrough.select([f"{i},{i % 20 + 10},x" for i in range(40)], sample=10)) == []
+            assert list(passthrough.select(lines, sample=0)) == [line for line in lines if line.split(",")[1:2] in [[str(i)] for i in range(1, 10)]]
+            assert list(MovieIdSet({3}).select([" 1 3 x ", "3 1"], delimiter=" ")) == ["1 3 x"]
+
+            path = tmp_path / "ratings.csv"
+            path.write_text("userId,movieId,rating,timestamp\n" +
+                            "".join(f"{u},{u % 20},4.0,{u}\n" for u in range(100)) + "1,03,4.0,1\n1, 3,4.0,1\n")
+            # пачки iter_csv читают один генератор отбора; переход к пропуску строк без отбора не закрывает файл
+            for sample, batch_size, count_lines in ((4, 7, None), (4, 7, 37), (4, 100, None), (4096, 7, 37)):
+                monkeypatch.setattr(MovieIdSet, "SAMPLE", sample)
+                valid = set(range(1, 20))
+                table = RatingsTable.from_csv(str(path), count_lines=count_lines, valid_movie_ids=valid, chunk_size=64)
+                batches = list(RatingsTable.iter_csv(str(path), count_lines=count_lines, valid_movie_ids=valid,
+                                                     batch_size=batch_size))
+                assert list(chain.from_iterable(batch.rows() for batch in batches)) == list(table.rows())
+                assert len(table) == (count_lines or 97)
+            for sample in (4, 4096):
+                monkeypatch.setattr(MovieIdSet, "SAMPLE", sample)
+                for valid in ({3}, set(range(19))):
+                    table = RatingsTable.from_csv(str(path), valid_movie_ids=valid)
+                    assert list(table.movie_id) == [int(row["movieId"]) for row in read_csv_as_dict(str(path))
+                                                    if int(row["movieId"]) in valid]
+
     class TestLinksClass:
 
         @pytest.fixture(scope="module")
         def links_obj(self):
             return Links(Tests.LINKS_FILE)
+
+        # страницы для локальной замены IMDb: imdbId -> (title, director, budget, gross worldwide, runtime, rating)
+        IMDB_PAGES = {
+            '0114709': ('История игрушек', 'John Lasseter', '$30,000,000 (estimated)', '$394,436,586', '1 hour 21 minutes', '8.3/10'),
+            '0113497': ('Джуманджи', 'Joe Johnston', '$65,000,000 (estimated)', '$262,821,940', '1 hour 44 minutes', '7.1/10'),
+            '0113228': ('Старые ворчуны разбушевались', 'Howard Deutch', '$25,000,000 (estimated)', '$71,518,503', '1 hour 41 minutes', '6.6/10'),
+        }
+        FLAKY_ID = '0113497'
+
+        @staticmethod
+        def imdb_page(title, director, budget, gross, runtime, rating):
+            return f"""<html><head><title>{title} (1995) - IMDb</title></head><body>
+                <h1><span>{title}</span></h1>
+                <div><span>IMDb RATING</span><div><span>{rating}</span></div></div>
+                <ul><li data-testid="title-pc-principal-credit"><span>Director</span><ul><li><a href="/name/">{director}</a></li></ul></li></ul>
+                <ul><li data-testid="title-boxoffice-budget"><span>Budget</span><div><span>{budget}</span></div></li>
+                <li data-testid="title-boxoffice-cumulativeworldwidegross"><span>Gross worldwide</span><div><span>{gross}</span></div></li></ul>
+                <ul><li data-testid="title-techspec_runtime"><span>Runtime</span><div>{runtime}</div></li></ul>
+                </body></html>"""
+
+        @pytest.fixture
+        def imdb_server(self, monkeypatch):
+            """Локальный HTTP-сервер вместо IMDb; первый запрос к FLAKY_ID отвечает 503"""
+            hits = Counter()
+            pages = Tests.TestLinksClass.IMDB_PAGES
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    imdb_id = self.path.strip('/').removeprefix('title/tt')
+                    hits[imdb_id] += 1
+                    if imdb_id == Tests.TestLinksClass.FLAKY_ID and hits[imdb_id] == 1:
+                        self.send_response(503)
+                        self.end_headers()
+                        return
+                    if imdb_id not in pages:
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    body = Tests.TestLinksClass.imdb_page(*pages[imdb_id]).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_port}/title/tt{{}}/"
+            Links.reset_fetcher(ImdbFetcher(max_workers=4, requests_per_second=0, backoff=0.01, url=url))
+            yield hits
+            Links.reset_fetcher()
+            server.shutdown()
+            server.server_close()
+
+        def test_fetch_many(self, imdb_server):
+            ids = ['0113228', '0000001', '0113497', '0114709']
+            result = Links.fetcher.fetch_many(ids)
+            assert [imdb_id for imdb_id, _, _ in result] == ids
+            assert result[1][1] is None and str(result[1][2]) == 'Error page: 404'
+            assert all(html is not None and error is None for i, (_, html, error) in enumerate(result) if i != 1)
+            assert 'Джуманджи' in result[2][1]
+            assert imdb_server[Tests.TestLinksClass.FLAKY_ID] == 2
+
+        def test_get_imdb_local(self, imdb_server):
+            result = Links.get_imdb(['0114709', '0113497', '0000001', '0113228'], ['Director', 'Budget', 'Gross worldwide', 'Runtime', 'Title'])
+            ans = [['0114709', 'John Lasseter', '$30,000,000 (estimated)', '$394,436,586', '1 hour 21 minutes', 'История игрушек'],
+                   ['0113497', 'Joe Johnston', '$65,000,000 (estimated)', '$262,821,940', '1 hour 44 minutes', 'Джуманджи'],
+                   ['0113228', 'Howard Deutch', '$25,000,000 (estimated)', '$71,518,503', '1 hour 41 minutes', 'Старые ворчуны разбушевались']]
+            assert result == ans
+
+        def test_get_imdb_rating_local(self, imdb_server):
+            result = Links.get_imdb_rating(['0113228', '0114709'])
+            assert result == [['0114709', 'История игрушек', '8.3/10'], ['0113228', 'Старые ворчуны разбушевались', '6.6/10']]
+
+        def test_imdb_cache(self, tmp_path):
+            cache = ImdbCache(str(tmp_path / "imdb.sqlite"))
+            cache.put('0114709', '<html>Toy Story</html>')
+            cache.put('0114709', {'Director': 'John Lasseter', 'Runtime': '1 hour 21 minutes'}, kind="record")
+            assert cache.get('0114709') == '<html>Toy Story</html>'
+            assert cache.get('0114709', kind="record") == {'Director': 'John Lasseter', 'Runtime': '1 hour 21 minutes'}
+            assert cache.get('0000001') is None
+            cache.close()
+            # кэш переживает перезапуск
+            reopened = ImdbCache(str(tmp_path / "imdb.sqlite"))
+            assert reopened.get_many(['0114709', '0000001']) == {'0114709': '<html>Toy Story</html>'}
+            with pytest.raises(ValueError):
+                reopened.get('0114709', kind="page")
+
+        def test_imdb_cache_ttl_and_eviction(self, tmp_path):
+            expired = ImdbCache(str(tmp_path / "ttl.sqlite"), ttl=-1)
+            expired.put('0114709', 'page')
+            assert expired.get('0114709') is None
+            size = len(zlib.compress(('a' * 1000).encode('utf-8')))
+            small = ImdbCache(str(tmp_path / "small.sqlite"), max_bytes=3 * size)
+            small.put('1', 'a' * 1000)
+            small.put('2', 'b' * 1000)
+            small.put('3', 'c' * 1000)
+            small.get('1')
+            small.put('4', 'd' * 1000)
+            # вытесняется давно не читавшаяся запись
+            assert len(small) == 3
+            assert small.get('2') is None
+            assert all(small.get(i) is not None for i in ('1', '3', '4'))
+            small.put('3', 'e' * 10)
+            total = lambda cache: cache._conn.execute("SELECT total FROM cache_size").fetchone()[0]
+            actual = lambda cache: cache._conn.execute("SELECT SUM(LENGTH(value)) FROM cache").fetchone()[0]
+            assert total(small) == actual(small)
+            small.close()
+            # файл кэша без таблицы размера: размер считается один раз при открытии
+            with sqlite3.connect(str(tmp_path / "small.sqlite")) as conn:
+                conn.execute("DROP TABLE cache_size")
+            reopened = ImdbCache(str(tmp_path / "small.sqlite"), max_bytes=3 * size)
+            assert total(reopened) == actual(reopened)
+            reopened.clear()
+            assert total(reopened) == 0
+
+        def test_get_fetcher(self, tmp_path):
+            # при импорте модуля загрузчик и его requests.Session не создаются
+            Links.reset_fetcher()
+            fetcher = Links.get_fetcher()
+            assert isinstance(fetcher, ImdbFetcher) and isinstance(fetcher.cache, ImdbCache)
+            assert Links.get_fetcher() is fetcher is Links.fetcher
+            # enable_cache закрывает прежний кэш, reset_fetcher - прежний загрузчик вместе с его кэшем
+            previous = fetcher.cache
+            cache = Links.enable_cache(str(tmp_path / "imdb.sqlite"))
+            assert fetcher.cache is cache
+            with pytest.raises(sqlite3.ProgrammingError):
+                len(previous)
+            Links.reset_fetcher()
+            assert Links.fetcher is None
+            with pytest.raises(sqlite3.ProgrammingError):
+                len(cache)
+
+        def test_get_imdb_cached(self, imdb_server, tmp_path):
+            Links.enable_cache(str(tmp_path / "imdb.sqlite"))
+            fields = ['Director', 'Runtime', 'Title']
+            first = Links.get_imdb(['0114709', '0113228'], fields)
+            hits = sum(imdb_server.values())
+            assert Links.get_imdb(['0114709', '0113228'], fields) == first
+            assert Links.get_imdb_rating(['0114709'])[0][2] == '8.3/10'
+            assert sum(imdb_server.values()) == hits
+            # запись старого формата, без 'Rating' и 'Page title', разбирается заново
+            Links.get_fetcher().cache.put('0114709', {'Director': 'John Lasseter', 'Title': 'Toy Story'}, "record")
+            assert Links.get_imdb_rating(['0114709'])[0][2] == '8.3/10'
+            assert Links.get_imdb_records(['0114709'], ['Rating', 'Page title'])['0114709']['Rating'] == '8.3/10'
+
+        def test_get_imdb_records(self, imdb_server):
+            Links.enable_cache(":memory:")
+            ids = ['0114709', '0113228', '9999999']
+            records = Links.get_imdb_records(ids, ['Director', 'Rating'])
+            assert list(records) == ['0114709', '0113228']
+            assert records['0114709'] == {'Director': 'John Lasseter', 'Rating': '8.3/10'}
+            assert imdb_server['0114709'] == 1 and imdb_server['0113228'] == 1
+            info = Links.get_imdb(ids, ['Director', 'Runtime'])
+            rating = Links.get_imdb_rating(ids)
+            assert [row[0] for row in info] == ['0114709', '0113228']
+            assert [row[0] for row in rating] == ['0114709', '0113228']
+            assert imdb_server['0114709'] == 1 and imdb_server['0113228'] == 1
+            assert set(Links.get_imdb_records(['0114709'])['0114709']) >= {'Director', 'Budget', 'Runtime', 'Rating', 'Page title'}
+
+        def test_links_lazy(self, imdb_server, tmp_path):
+            path = tmp_path / "links.csv"
+            path.write_text("movieId,imdbId,tmdbId\n1,0114709,862\n2,0113497,8844\n3,0113228,15602\n")
+            links = Links(str(path))
+            assert links.dict_file == ['0114709', '0113497', '0113228']
+            assert sum(imdb_server.values()) == 0
+            assert links.top_directors(3) == {'John Lasseter': 1, 'Joe Johnston': 1, 'Howard Deutch': 1}
+            hits = sum(imdb_server.values())
+            assert hits > 0
+            assert len(links.imdb_info) == 3
+            assert sum(imdb_server.values()) == hits
+            assert links.prefetch() == links.imdb_info
+
+        @pytest.mark.parametrize("html, fields", [
+            ("canned", {'Director': 'John Lasseter', 'Budget': '$30,000,000 (estimated)',
+                        'Gross worldwide': '$394,436,586', 'Runtime': '1 hour 21 minutes', 'Title': 'История игрушек',
+                        'Rating': '8.3/10', 'Page title': 'История игрушек (1995) - IMDb'}),
+            ('<html><body><h1>  A <b>B</b><script>x = 1</script></h1><!--IMDb RATING--><div> 7.5/10 </div></body></html>',
+             {'Title': 'A B', 'Rating': '7.5/10'}),
+            # обработка кассовых сборов прерывается на элементе без span
+            ('<ul><li data-testid="title-boxoffice-section"><span>Budget</span><span>$1</span></li>'
+             '<li data-testid="title-boxoffice-section"><b>no spans</b></li>'
+             '<li data-testid="title-boxoffice-section"><span>Runtime</span><span>2 hours</span></li></ul>',
+             {'Budget': '$1'}),
+            ('<li data-testid="title-pc-principal-credit"><span>Stars</span></li><p>IMDb RATING<br>9.9</p>',
+             {'Rating': ''}),
+            ('', {}),
+        ])
+        def test_parse_page(self, html, fields):
+            if html == "canned":
+                html = Tests.TestLinksClass.imdb_page(*Tests.TestLinksClass.IMDB_PAGES['0114709'])
+            record = Links.parse_page(html)
+            expected = {'Director': 'Unknown', 'Budget': '0', 'Gross worldwide': '0', 'Gross US & Canada': '0',
+                        'Opening weekend US & Canada': '0', 'Runtime': '0', 'Title': '-',
+                        'Rating': None, 'Page title': None}
+            expected.update(fields)
+            assert record == expected
+
+        def test_rate_limiter(self, monkeypatch):
+            # время не идёт само: wait() видит только подставленные часы, sleep() записывается
+            now = [100.0]
+            sleeps = []
+            monkeypatch.setattr(time, "monotonic", lambda: now[0])
+            monkeypatch.setattr(time, "sleep", sleeps.append)
+            limiter = RateLimiter(50)
+            for _ in range(4):
+                limiter.wait()
+            assert sleeps == pytest.approx([0.02, 0.04, 0.06])
+            now[0] += 1.0
+            limiter.wait()
+            assert len(sleeps) == 3
+            assert RateLimiter(0).interval == 0.0
        
         def test_links_init(self, links_obj):
             assert isinstance(links_obj._path_to_the_file, str)
@@ -990,7 +3140,7 @@ class Tests:
         #     print(Tests.links.imdb_info == Tests.links._Links__imdb_getter())
     
         def test_read_csv_column(self, links_obj):
-            movies = Movies(Tests.MOVIES_FILE)
+            movies = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             movies_list = movies.get_movies()
             movie_ids = set(int(m["movieId"]) for m in movies_list)
             result = links_obj.read_csv_column(file_path=Tests.LINKS_FILE, column_name="imdbId", valid_movie_ids=movie_ids)[:10]
@@ -1070,12 +3220,12 @@ class Tests:
         @pytest.fixture(scope="module")
         def movies_obj(self):
             """Фикстура для создания объекта Movies"""
-            return Movies(Tests.MOVIES_FILE)
+            return Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
 
         def test_movies_init(self, movies_obj):
             """Тестирование инициализации класса Movies"""
             assert isinstance(movies_obj.movies_list, list)
-            assert all(isinstance(movie, dict) for movie in movies_obj.movies_list)
+            assert all(isinstance(movie, Movie) for movie in movies_obj.movies_list)
             assert "movieId" in movies_obj.movies_list[0]
             assert "title" in movies_obj.movies_list[0]
             assert "genres" in movies_obj.movies_list[0]
@@ -1089,7 +3239,7 @@ class Tests:
                     result
                 assert str(e.value) == f"Ошибка при чтении файла Movies: {e}"
             else:
-                assert all(isinstance(i, dict) for i in result)
+                assert all(isinstance(i, Movie) for i in result)
                 for movie in result:
                     assert isinstance(movie["movieId"], int)
                     assert isinstance(movie["title"], str)
@@ -1104,7 +3254,7 @@ class Tests:
                     result
                 assert str(e.value) == f"Ошибка при чтении файла Movies: {e}"
             else:
-                assert all(isinstance(i, dict) for i in result)
+                assert all(isinstance(i, Movie) for i in result)
                 for movie in result:
                     assert isinstance(movie["movieId"], int)
                     assert isinstance(movie["title"], str)
@@ -1215,15 +3365,133 @@ class Tests:
             counts = list(result.values())
             assert all(counts[i] >= counts[i+1] for i in range(len(counts)-1))
             assert result == answer
+
+        def test_movie_catalog(self, small_dataset):
+            path = small_dataset / "movies.csv"
+            catalog = MovieCatalog.load(str(path))
+            assert MovieCatalog.load(str(path)) is catalog
+            assert catalog.titles == {1: 'Toy Story (1995)', 2: 'Heat, The (1995)', 3: 'Amélie (2001)', 4: 'Untitled'}
+            assert catalog.years == {1: 1995, 2: 1995, 3: 2001}
+            assert Movies(str(path)).movies_list == catalog.movies
+            assert Movies(str(path)).catalog is catalog
+            path.write_text('movieId,title,genres\n3,Casino (1995),Crime|Drama\n')
+            reloaded = MovieCatalog.load(str(path))
+            assert reloaded is not catalog
+            assert reloaded.titles == {3: 'Casino (1995)'}
+            # от прежней версии файла в памяти ничего не остаётся, каталог с другим max_lines не трогается
+            limited = MovieCatalog.load(str(path), max_lines=1)
+            entries = [key for key in MovieCatalog._loaded if key[0] == os.path.abspath(str(path))]
+            assert len(entries) == 2 and all(MovieCatalog._loaded[key] in (reloaded, limited) for key in entries)
+
+        def test_movie_catalog_quoting(self, tmp_path):
+            path = tmp_path / "movies.csv"
+            path.write_text('movieId,title,genres\n'
+                            '3338,"""Great Performances"" Cats (1998)",Musical\n'
+                            '7,"Sabrina, ""the"" Remake (1995)",Comedy|Romance\n'
+                            '\n'
+                            '8,Tom, Huck (1995),Adventure\n'
+                            'x,Bad id,Drama\n'
+                            '9,"Multi\nLine (2000)",(no genres listed)\n', encoding='utf-8')
+            assert MovieCatalog.parse(str(path)) == [
+                {"movieId": 3338, "title": '"Great Performances" Cats (1998)', "genres": ["Musical"]},
+                {"movieId": 7, "title": 'Sabrina, "the" Remake (1995)', "genres": ["Comedy", "Romance"]},
+                {"movieId": 8, "title": 'Tom, Huck (1995)', "genres": ["Adventure"]},
+                {"movieId": 9, "title": 'Multi\nLine (2000)', "genres": ["(no genres listed)"]},
+            ]
+            assert [m["movieId"] for m in MovieCatalog.parse(str(path), max_lines=3)] == [3338, 7]
+
+        def test_movie_catalog_years(self, tmp_path):
+            path = tmp_path / "movies.csv"
+            path.write_text('movieId,title,genres\n'
+                            '1,Toy Story (1995),Animation\n'
+                            '2,"Fly (1986) (Remake, 1995)",Horror\n'
+                            '3,Cosmos (1980) (TV),Documentary\n'
+                            '4,No Year,Drama\n'
+                            '5,Heat (1995),Action\n')
+            catalog = MovieCatalog.load(str(path))
+            assert list(catalog.year) == [1995, 0, 0, 0, 1995]
+            assert list(catalog.release_year) == [1995, 1986, 1980, 0, 1995]
+            assert catalog.years == {1: 1995, 5: 1995}
+            assert catalog.movie_ids_by_year(1995) == [1, 5]
+            assert catalog.movie_ids_by_year(1986) == [2]
+            assert catalog.release_counts == {'1995': 2, '1986': 1, '1980': 1}
+            movies = Movies(str(path))
+            assert movies.dist_by_release() == OrderedDict([('1995', 2), ('1986', 1), ('1980', 1)])
+            assert movies.movies_by_year(1995) == movies.movies_by_year("1995") == [
+                {'Toy Story (1995)': ['Animation']}, {'Heat (1995)': ['Action']}]
+            assert movies.movies_by_year(2000) == []
+            ratings_path = tmp_path / "ratings.csv"
+            ratings_path.write_text("userId,movieId,rating,timestamp\n" + "".join(
+                f"{u},{u % 6},{u % 10 / 2 + 0.5},{964982703 + u * 10 ** 7}\n" for u in range(60)))
+            ratings = Ratings(str(ratings_path), str(path), None)
+            indexed = ratings.Movies(ratings, movies.get_movies())
+            scanned = ratings.Movies(ratings, [Movie(m.movie_id, m.title, m.genres) for m in movies.get_movies()])
+            assert indexed._catalog is not None and scanned._catalog is None
+            for genre in (None, "Action", "Horror", "Western"):
+                for year in (None, 1995, 1986, 1980, 2000):
+                    assert (indexed.average_genre_rating_by_year(genre, year)
+                            == scanned.average_genre_rating_by_year(genre, year)), (genre, year)
+            assert list(indexed.average_genre_rating_by_year("Action", 1995).values())[0]["count"] > 0
+
+        def test_movie_catalog_genres(self, tmp_path):
+            path = tmp_path / "movies.csv"
+            path.write_text('movieId,title,genres\n'
+                            '1,Toy Story (1995),Adventure|Animation|Children\n'
+                            '2,Jumanji (1995),Adventure|Children\n'
+                            '3,Heat (1995),Action|Crime\n'
+                            '4,Balto (1995),Children|Animation|Adventure\n'
+                            '5,Nothing (1995),(no genres listed)\n'
+                            '6,Empty (1995),\n')
+            catalog = MovieCatalog.load(str(path))
+            assert list(catalog.genre_bits) == ['Adventure', 'Animation', 'Children', 'Action', 'Crime', '(no genres listed)']
+            assert catalog.genre_mask[0] == catalog.genre_mask[3] == 0b111
+            assert catalog.genre_mask[5] == 0
+            assert catalog.movie_ids_by_genre('Children') == [1, 2, 4]
+            assert catalog.genre_mask_of(['Crime', 'Western']) == 0b10000
+            assert catalog.genre_names(0b10001) == ['Adventure', 'Crime']
+            movies = Movies(str(path))
+            assert movies.movies_by_genre('Animation') == ['Toy Story (1995)', 'Balto (1995)']
+            assert movies.movies_by_genre('Western') == []
+            assert movies.common_genre_combinations(2) == {'Adventure|Animation|Children': 2, 'Adventure|Children': 1}
+            # у фильмов с одинаковой строкой жанров разные списки
+            (tmp_path / "twins.csv").write_text('movieId,title,genres\n1,A (1995),Drama|Crime\n2,B (1995),Drama|Crime\n')
+            MovieCatalog.clear()
+            twins = Movies(str(tmp_path / "twins.csv"))
+            twins.get_movies()[0]["genres"].append("Comedy")
+            assert twins.get_movies()[1].genres == ["Drama", "Crime"]
+            assert sorted(len(genres) for m in twins.movies_by_year(1995) for genres in m.values()) == [2, 3]
+
+        def test_movie_catalog_titles(self, tmp_path):
+            movies_path = tmp_path / "movies.csv"
+            movies_path.write_text('movieId,title,genres\n'
+                                   '2571,"Matrix, The (1999)",Action|Sci-Fi\n'
+                                   '6365,Matrix Reloaded (2003),Action|Sci-Fi\n'
+                                   '9999,"matrix, the (1999)",Drama\n'
+                                   '4995,"Beautiful Mind, A (2001)",Drama\n')
+            tags_path = tmp_path / "tags.csv"
+            tags_path.write_text('userId,movieId,tag,timestamp\n'
+                                 '1,2571,cyberpunk,1\n2,2571,philosophy,2\n3,4995,mathematics,3\n')
+            movies = Movies(str(movies_path))
+            assert movies.get_movie_id_by_title("MATRIX, THE (1999)") == 2571
+            assert movies.get_movie_id_by_title("The Matrix (1999)") is None
+            assert movies.get_movie_id_by_title("The Matrix (1999)", fuzzy=True) == 2571
+            assert movies.get_movie_ids_by_titles(["Matrix Reloaded (2003)", "a beautiful  mind (2001)", "Heat"],
+                                                  fuzzy=True) == {
+                "Matrix Reloaded (2003)": 6365, "a beautiful  mind (2001)": 4995, "Heat": None}
+            tags = Tags(str(tags_path), [2571, 6365, 4995])
+            assert tags.get_tags_for_movie("Matrix, The (1999)", movies) == ['cyberpunk', 'philosophy']
+            assert tags.get_tags_for_movies(["The Matrix (1999)", "A Beautiful Mind (2001)", "Heat"], movies,
+                                            fuzzy=True) == {
+                "The Matrix (1999)": ['cyberpunk', 'philosophy'], "A Beautiful Mind (2001)": ['mathematics'], "Heat": []}
         
 
     class TestRatingsClass:
         @pytest.fixture
         def ratings_obj(self):
-            movies = Movies(Tests.MOVIES_FILE)
+            movies = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             movies_list = movies.get_movies()
             movie_ids = set(int(m["movieId"]) for m in movies_list)
-            ratings_obj = Ratings(Tests.RATINGS_FILE, Tests.MOVIES_FILE, movie_ids)
+            ratings_obj = Ratings(Tests.RATINGS_FILE, Tests.MOVIES_FILE, movie_ids, max_lines=Tests.MAX_LINES)
             return ratings_obj
 
         def test_ratings_init(self, ratings_obj):
@@ -1237,14 +3505,10 @@ class Tests:
 
             ratings = ratings_obj.ratings
 
-            assert isinstance(ratings, list)
-            assert all(isinstance(rating, dict) for rating in ratings)
-            # assert "userId" in ratings[0]
-            # assert "movieId" in ratings[0]
-            # assert "rating" in ratings[0]
-            # assert "timestamp" in ratings[0]
+            assert isinstance(ratings, RatingsTable)
+            assert ratings.nbytes() == 20 * len(ratings)
 
-            for rating in ratings:
+            for rating in ratings.rows():
                 assert isinstance(rating["userId"], int)
                 assert isinstance(rating["movieId"], int)
                 assert isinstance(rating["rating"], float)
@@ -1260,7 +3524,7 @@ class Tests:
         def test_ratings_init_movies(self, ratings_obj):
 
             assert isinstance(ratings_obj.movies, list)
-            assert all(isinstance(movie, dict) for movie in ratings_obj.movies)
+            assert all(isinstance(movie, Movie) for movie in ratings_obj.movies)
 
             for movie in ratings_obj.movies:
                 assert isinstance(movie["movieId"], int)
@@ -1278,6 +3542,13 @@ class Tests:
                     assert isinstance(movie["genres"], list)
                     assert all(isinstance(i, str) for i in movie["genres"])
 
+        def test_ratings_full_load(self, ratings_obj):
+            full = Ratings(Tests.RATINGS_FILE, Tests.MOVIES_FILE, None, chunk_size=4096)
+            assert len(full.ratings) > len(ratings_obj.ratings)
+            assert full.load_stats["rows"] == len(full.ratings)
+            assert full.load_stats["rows_per_sec"] > 0
+            assert list(full.ratings.rows())[:10] == list(ratings_obj.ratings.rows())[:10]
+
         def test_get_ratings_for_movies(self, ratings_obj):
             result = ratings_obj.get_ratings_for_movies(ratings_obj.movies)
             print(result)
@@ -1296,6 +3567,19 @@ class Tests:
             def ratings_movies_obj(self, ratings_obj):
                 return ratings_obj.Movies(ratings_obj, ratings_obj.movies)
 
+            def test_aggregate(self, ratings_movies_obj):
+                result = ratings_movies_obj.aggregate()
+                total = len(ratings_movies_obj.ratings)
+                assert set(result) == set(ratings_movies_obj.AGGREGATES)
+                assert sum(result["dist_by_year"].values()) == total
+                assert sum(result["dist_by_rating"].values()) == total
+                assert sum(st.count for st in result["movie_stats"].values()) == total
+                assert sum(h.count for h in result["movie_histograms"].values()) == total
+                # повторный запрос берется из кэша
+                assert ratings_movies_obj.aggregate(("dist_by_rating",))["dist_by_rating"] is result["dist_by_rating"]
+                with pytest.raises(ValueError):
+                    ratings_movies_obj.aggregate(("unknown",))
+
             def test_dist_by_year(self, ratings_movies_obj):
 
                 result = ratings_movies_obj.dist_by_year()
@@ -1461,23 +3745,164 @@ class Tests:
                 assert result2[2000] == {'Средний рейтинг': 4.12, 'оценок': 41, 'пользователей': 2}
                 assert result2[1998] == {'Средний рейтинг': 4.27, 'оценок': 11, 'пользователей': 1}
 
+        def test_movie_index(self, small_dataset):
+            ratings_path, movies_path = small_dataset / "ratings.csv", small_dataset / "movies.csv"
+            rows = [(u, m, r) for u, (m, r) in enumerate([(3, 4.0), (1, 3.5), (3, 2.0), (2, 5.0), (1, 1.0), (3, 0.5)] * 3)]
+            ratings_path.write_text("userId,movieId,rating,timestamp\n" +
+                                    "".join(f"{u},{m},{r},964982703\n" for u, m, r in rows))
+            ratings = Ratings(str(ratings_path), str(movies_path), None)
+            offsets, index_rows, index_ratings = ratings.ratings.movie_index()
+            assert list(offsets.items()) == [(3, (0, 9)), (1, (9, 15)), (2, (15, 18))]
+            assert list(index_rows[9:15]) == [1, 4, 7, 10, 13, 16]
+            assert list(ratings.ratings.ratings_of_movie(2)) == [5.0, 5.0, 5.0]
+            for ids in ([3], {1, 2}, (1, 2, 3, 99), []):
+                assert ratings.get_ratings_for_movies(ids) == [r for _, m, r in rows if m in ids]
+            assert ratings.get_ratings_for_movies([{"movieId": 1}]) == []
+            ratings.ratings.append(7, 2, 4.5, 964982703)
+            assert list(ratings.ratings.ratings_of_movie(2)) == [5.0, 5.0, 5.0, 4.5]
+            movies = Ratings.Movies(ratings, ratings.movies)
+            assert movies.dist_by_rating() == {0.5: 3, 1.0: 3, 2.0: 3, 3.5: 3, 4.0: 3, 4.5: 1, 5.0: 3}
+            assert set(movies._aggregates) == set(movies.AGGREGATES)  # все агрегаты за один проход
+            assert movies.top_controversial(2) == {"Amélie (2001)": 2.31, "Toy Story (1995)": 1.88}
+
+        def test_user_index(self, small_dataset):
+            ratings_path, movies_path = small_dataset / "ratings.csv", small_dataset / "movies.csv"
+            ratings_path.write_text("userId,movieId,rating,timestamp\n"
+                                    "2,1,4.0,10\n1,2,3.0,20\n2,3,5.0,30\n3,1,4.0,40\n1,1,3.0,50\n2,2,3.0,60\n")
+            ratings = Ratings(str(ratings_path), str(movies_path), None)
+            offsets, rows, values = ratings.ratings.user_index()
+            assert list(offsets) == [2, 1, 3]
+            assert list(ratings.ratings.ratings_of_user(2)) == [4.0, 5.0, 3.0]
+            users = ratings.Users(ratings, ratings.movies)
+            assert users.ratings_of_user(1) == [{"userId": 1, "movieId": 2, "rating": 3.0, "timestamp": 20},
+                                                {"userId": 1, "movieId": 1, "rating": 3.0, "timestamp": 50}]
+            assert users.ratings_of_user(99) == []
+            assert users.dist_by_num_of_ratings() == {3.0: 2, 4.0: 2, 5.0: 1}
+            assert users.dist_by_user_rating() == {3.0: 1, 4.0: 2}
+            assert users.dist_by_user_rating("median") == {3.0: 1, 4.0: 2}
+            assert users.top_controversial(5) == {2: 1.0, 1: 0.0}
+            # каталог узнаётся по записям фильмов, а не по тому, тот же ли это список
+            movies = Movies(str(movies_path))
+            for same in (movies.get_movies(), movies, ratings.catalog, list(ratings.movies)):
+                assert ratings.catalog_of(same) is ratings.catalog
+                assert ratings.Users(ratings, same)._catalog is ratings.catalog
+                assert ratings.Movies(ratings, same)._catalog is ratings.catalog
+            copies = [Movie(m.movie_id, m.title, m.genres) for m in ratings.movies]
+            for other in (copies, ratings.movies[:2]):
+                assert ratings.catalog_of(other) is None
+            slow = ratings.Users(ratings, copies)
+            assert slow._catalog is None
+            assert slow.genre_rating_trend_by_year() == users.genre_rating_trend_by_year()
+            assert (ratings.Movies(ratings, copies).average_genre_rating_by_year("Comedy")
+                    == ratings.Movies(ratings, movies.get_movies()).average_genre_rating_by_year("Comedy"))
+
+        def test_parallel_load(self, tmp_path):
+            ratings_path = tmp_path / "ratings.csv"
+            lines = [f"{u % 7 + 1},{u % 5 + 1},{u % 10 / 2 + 0.5},{964982703 + u}" for u in range(300)]
+            lines[10:10] = ["", "1,2,3", "x,2,4.0,1", "5,abc,4.0,1", "2,3,4.0,1\r"]
+            ratings_path.write_bytes(("userId,movieId,rating,timestamp\n" + "\n".join(lines)).encode())
+            size = ratings_path.stat().st_size
+            ranges = split_file(str(ratings_path), header_end(str(ratings_path)), 8)
+            assert ranges[0][0] == header_end(str(ratings_path)) and ranges[-1][1] == size
+            assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+            for valid in (None, {1, 3, 5}):
+                serial = RatingsTable.from_csv(str(ratings_path), valid_movie_ids=valid)
+                parallel = RatingsTable.from_csv(str(ratings_path), valid_movie_ids=valid, workers=3)
+                assert parallel.columns() == serial.columns()
+                assert len(serial) == (301 if valid is None else 181)
+
+            tags_path = tmp_path / "tags.csv"
+            tags = ["dark", "funny", "Amélie", "dark comedy", "  funny "]
+            tags_path.write_text("userId,movieId,tag,timestamp\n" + "".join(
+                f"{i % 3},{i % 6 + 1},{tags[i % len(tags)]},{i}\n" for i in range(200)) + "1,2,a,b,c\n,,,\n")
+            serial = Tags(str(tags_path), [1, 2, 3, 4])
+            parallel = Tags(str(tags_path), [1, 2, 3, 4], workers=3)
+            assert parallel.vocabulary.tags == serial.vocabulary.tags
+            assert parallel.vocabulary.frequency == serial.vocabulary.frequency
+            assert parallel._tag_codes == serial._tag_codes
+            assert parallel._movie_tag_codes == serial._movie_tag_codes
+            assert list(parallel._movie_tag_codes) == list(serial._movie_tag_codes)
+
+        def test_snapshot(self, small_dataset):
+            ratings_path, movies_path = small_dataset / "ratings.csv", small_dataset / "movies.csv"
+            movies = Movies(str(movies_path))
+            ratings = Ratings(str(ratings_path), str(movies_path), None)
+            tags = Tags(str(small_dataset / "tags.csv"), [1, 2, 3])
+            links = Links(str(small_dataset / "links.csv"))
+            Snapshot.save(str(small_dataset / "snap"), movies, ratings, tags, links)
+
+            snapshot = Snapshot.load(str(small_dataset / "snap"))
+            assert not snapshot.is_stale()
+            assert isinstance(snapshot.ratings.ratings.rating, memoryview)
+            assert snapshot.movies.movies_list == movies.movies_list
+            assert snapshot.movies.dist_by_genres() == movies.dist_by_genres()
+            assert snapshot.movies.get_movie_id_by_title("the heat (1995)", fuzzy=True) == 2
+            assert snapshot.ratings.movies == ratings.movies
+            assert snapshot.ratings.catalog is snapshot.movies.catalog
+            assert list(snapshot.ratings.ratings.rows()) == list(ratings.ratings.rows())
+            assert snapshot.ratings.get_ratings_for_movies([1]) == ratings.get_ratings_for_movies([1])
+            new = snapshot.ratings.Movies(snapshot.ratings, snapshot.ratings.movies)
+            old = ratings.Movies(ratings, ratings.movies)
+            assert new.top_by_ratings(3) == old.top_by_ratings(3)
+            assert new.dist_by_year() == old.dist_by_year()
+            new_users = snapshot.ratings.Users(snapshot.ratings, snapshot.ratings.movies)
+            old_users = ratings.Users(ratings, ratings.movies)
+            assert new_users.dist_by_user_rating() == old_users.dist_by_user_rating()
+            assert snapshot.tags.get_all_tags() == tags.get_all_tags()
+            assert snapshot.tags.most_popular(2) == tags.most_popular(2)
+            assert snapshot.tags.get_tags_for_movie("Amélie (2001)", movies) == tags.get_tags_for_movie("Amélie (2001)", movies)
+            assert snapshot.tags.tags_with("FUN") == ["funny"]
+            assert snapshot.links.dict_file == links.dict_file
+
+            ratings_path.write_text(ratings_path.read_text() + "3,2,1.0,1\n")
+            assert snapshot.is_stale()
+            manifest = small_dataset / "snap" / "manifest.json"
+            manifest.write_text(manifest.read_text().replace('"version": 1', '"version": 99'))
+            with pytest.raises(ValueError):
+                Snapshot.load(str(small_dataset / "snap"))
+
+        def test_snapshot_close(self, small_dataset):
+            ratings_path, movies_path = small_dataset / "ratings.csv", small_dataset / "movies.csv"
+            snapshot_path = str(small_dataset / "snap")
+            Snapshot.save(snapshot_path, ratings=Ratings(str(ratings_path), str(movies_path), None))
+            with Snapshot.load(snapshot_path) as snapshot:
+                column = snapshot.ratings.ratings.rating
+                maps = list(snapshot._maps)
+                rows = list(snapshot.ratings.ratings.rows())
+                # сохранение поверх открытого снимка не трогает его отображённые файлы
+                ratings_path.write_text("userId,movieId,rating,timestamp\n" + "3,2,1.0,1\n" * 1000)
+                Snapshot.save(snapshot_path, ratings=Ratings(str(ratings_path), str(movies_path), None))
+                assert list(snapshot.ratings.ratings.rows()) == rows
+                with Snapshot.load(snapshot_path) as saved:
+                    assert len(saved.ratings.ratings) == 1000
+            assert maps and all(mapped.closed for mapped in maps) and not snapshot._views
+            with pytest.raises(ValueError):
+                column[0]
+            assert not any(name.endswith(".tmp") for name in os.listdir(snapshot_path))
+
 
     class TestTagsClass:
         """Тесты для класса Tags"""
         
         @pytest.fixture
         def tags_obj(self):
-            movies = Movies(Tests.MOVIES_FILE)
+            movies = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             movies_list = movies.get_movies()
             movie_ids = set(int(m["movieId"]) for m in movies_list)
-            return Tags(Tests.TAGS_FILE, movie_ids)
+            return Tags(Tests.TAGS_FILE, movie_ids, max_lines=Tests.MAX_LINES)
 
         def test_tags_init(self, tags_obj):
             """Тестирование инициализации класса Tags"""
             assert isinstance(tags_obj.tags, set)
             assert all(isinstance(tag, str) for tag in tags_obj.tags)
             assert isinstance(tags_obj.tag_list, list)
+            assert all(isinstance(tag, str) for tag in tags_obj.tag_list)
             assert isinstance(tags_obj.movie_tags, dict)
+            assert all(isinstance(tags, list) for tags in tags_obj.movie_tags.values())
+            assert all(isinstance(tag_ids, array) for tag_ids in tags_obj._movie_tag_codes.values())
+            assert tags_obj.tags == set(tags_obj.tag_list) == set(tags_obj.vocabulary.tags)
+            assert sum(tags_obj.vocabulary.frequency) == len(tags_obj.tag_list)
+            assert tags_obj.movie_tags == tags_obj.get_all_tags()
 
         def test_most_words(self, tags_obj):
             result = tags_obj.most_words(10)
@@ -1507,7 +3932,7 @@ class Tests:
         
 
         def test_tag_statistics(self, tags_obj):
-            movie = Movies(Tests.MOVIES_FILE)
+            movie = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             result = tags_obj.tag_statistics(movie)
             assert isinstance(result, dict)
             assert all(isinstance(title, str) for title in result.keys())
@@ -1521,7 +3946,7 @@ class Tests:
             
         def test_get_tags_for_movie(self, tags_obj):
             test_title = "Psycho (1960)"
-            movie = Movies(Tests.MOVIES_FILE)
+            movie = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             result = tags_obj.get_tags_for_movie(test_title, movie)
             assert isinstance(result, list)
             assert all(isinstance(tag, str) for tag in result)
@@ -1560,16 +3985,32 @@ class Tests:
             assert result == answer
 
         def test_top_moveis_by_tag(self, tags_obj):
-            movies = Movies(Tests.MOVIES_FILE)
+            movies = Movies(Tests.MOVIES_FILE, max_lines=Tests.MAX_LINES)
             movies_list = movies.get_movies()
             movie_ids = set(int(m["movieId"]) for m in movies_list)
-            ratings_obj = Ratings(Tests.RATINGS_FILE, Tests.MOVIES_FILE, movie_ids)
+            ratings_obj = Ratings(Tests.RATINGS_FILE, Tests.MOVIES_FILE, movie_ids, max_lines=Tests.MAX_LINES)
             result = tags_obj.top_movies_by_tag('In Netflix queue', ratings_obj, movies, 10)
             ans = {'Crumb (1994)': 5.0, 'Once Were Warriors (1994)': 5.0, 'Eat Drink Man Woman (Yin shi nan nu) (1994)': 4.5,
                    'Lone Star (1996)': 4.0, 'When We Were Kings (1996)': 4.0, 'Secret Garden, The (1993)': 3.5, 
                    'My Family (1995)': 3.0}
             assert result == ans
 
+        def test_tag_index(self, small_dataset):
+            index = TagIndex(["Dark hero", "dark comedy", "Comedy", "darkness", "BD-R"],
+                             {10: [2, 1], 5: [4], 7: [3, 0, 2]})
+            assert index.tags_containing("DARK") == ["Dark hero", "dark comedy", "darkness"]
+            assert index.tags_containing("k c") == ["dark comedy"]
+            assert index.tags_containing("d") == ["BD-R", "Comedy", "Dark hero", "dark comedy", "darkness"]
+            assert index.tags_containing("zzz") == []
+            assert len(index.containing("")) == 5
+            assert sorted(index.tags[i] for i in index.with_token("Comedy")) == ["Comedy", "dark comedy"]
+            assert index.movies_with("comedy") == [10, 7]
+            assert index.movies_with("r") == [10, 5, 7]
+            tags = Tags(str(small_dataset / "tags.csv"), [1, 2, 3])
+            assert tags.tags_with("AR") == ["Paris", "pixar"]
+            assert tags.tags_with_word("PARIS") == ["Paris"] and tags.tags_with_word("fun") == []
+            assert tags.index.movies_with("fun") == [1, 3]
+
 
 if __name__ == "__main__":
     print("This module is not intended to be run directly. Use it as a library.")